@@ -1,16 +1,32 @@
 import logging
+import multiprocessing
 
 from tqdm import tqdm
 
 log = logging.getLogger(__name__)
 
+_arenas = None  # Arenas of an arena worker process, see Arena.playGames
+
+
+def _initArenaWorker(playerFactory, game):
+    global _arenas
+    player1, player2 = playerFactory()
+    _arenas = (Arena(player1, player2, game), Arena(player2, player1, game))
+
+
+def _playArenaGame(swapped):
+    # results are returned from the point of view of player1
+    if swapped:
+        return -_arenas[1].playGame()
+    return _arenas[0].playGame()
+
 
 class Arena():
     """
     An Arena class where any 2 agents can be pit against each other.
     """
 
-    def __init__(self, player1, player2, game, display=None):
+    def __init__(self, player1, player2, game, display=None, playerFactory=None):
         """
         Input:
             player 1,2: two functions that takes board as input, return action
@@ -18,6 +34,10 @@ class Arena():
             display: a function that takes board as input and prints it (e.g.
                      display in othello/OthelloGame). Is necessary for verbose
                      mode.
+            playerFactory: a picklable callable returning a fresh (player1,
+                           player2) pair. Is necessary for playing games in
+                           parallel, where every worker process builds its
+                           own players with it.
 
         see othello/OthelloPlayers.py for an example. See pit.py for pitting
         human players/other baselines with each other.
@@ -26,6 +46,7 @@ class Arena():
         self.player2 = player2
         self.game = game
         self.display = display
+        self.playerFactory = playerFactory
 
     def playGame(self, verbose=False):
         """
@@ -71,16 +92,19 @@ class Arena():
                 return curPlayer * result
             curPlayer = nextPlayer
 
-    def playGames(self, num, verbose=False):
+    def playGames(self, num, verbose=False, numWorkers=1):
         """
         Plays num games in which player1 starts num/2 games and player2 starts
-        num/2 games.
+        num/2 games. With numWorkers > 1 the games are spread over a pool of
+        numWorkers processes, see playerFactory in __init__.
 
         Returns:
             oneWon: games won by player1
             twoWon: games won by player2
             draws:  games won by nobody
         """
+        if numWorkers > 1:
+            return self.playGamesParallel(num, numWorkers)
 
         num = int(num / 2)
         oneWon = 0
@@ -107,3 +131,28 @@ class Arena():
                 draws += 1
 
         return oneWon, twoWon, draws
+
+    def playGamesParallel(self, num, numWorkers):
+        """
+        Same as playGames, but plays the games in a pool of numWorkers
+        processes, each with the players returned by self.playerFactory.
+        """
+        assert self.playerFactory, 'playing games in parallel needs a playerFactory'
+
+        num = int(num / 2)
+        oneWon = 0
+        twoWon = 0
+        draws = 0
+        # spawn, as forked processes can deadlock in CUDA and the threaded framework runtimes
+        context = multiprocessing.get_context('spawn')
+        with context.Pool(numWorkers, initializer=_initArenaWorker, initargs=(self.playerFactory, self.game)) as pool:
+            games = pool.imap_unordered(_playArenaGame, [False] * num + [True] * num)
+            for gameResult in tqdm(games, total=2 * num, desc="Arena.playGames"):
+                if gameResult == 1:
+                    oneWon += 1
+                elif gameResult == -1:
+                    twoWon += 1
+                else:
+                    draws += 1
+
+        return oneWon, twoWon, draws
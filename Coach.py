@@ -1,4 +1,5 @@
 import logging
+import multiprocessing
 import os
 import sys
 from collections import deque
@@ -9,10 +10,122 @@ import numpy as np
 from tqdm import tqdm
 
 from Arena import Arena
+from EvaluationCache import EvaluationCache
+from ExampleStore import ExampleShard, ExampleStore
+from InferenceServer import InferenceServer
 from MCTS import MCTS
+from utils import SparsePolicy, predictBoards
 
 log = logging.getLogger(__name__)
 
+_selfPlayCoach = None  # Coach of a self-play worker process, see Coach.selfPlayParallel
+
+
+def _initSelfPlayWorker(game, nnetClass, args, folder, filename, client):
+    global _selfPlayCoach
+    if client is not None:
+        nnet = client
+    else:
+        nnet = nnetClass(game)
+        nnet.load_checkpoint(folder=folder, filename=filename)
+    _selfPlayCoach = Coach(game, nnet, args)
+
+
+class SelfPlayEpisode():
+    """
+    This class holds the state of one self-play game and collects its
+    training examples. It is driven by Coach.executeEpisode and by
+    Coach.executeEpisodesLockstep.
+    """
+
+    def __init__(self, game, args):
+        self.game = game
+        self.args = args
+        self.trainExamples = []
+        self.board = self.game.getInitBoard()
+        self.curPlayer = 1
+        self.episodeStep = 0
+        self.results = [-1, None, -1]
+        self.ended = False
+
+    def nextTurn(self):
+        """
+        Returns:
+            canonicalBoard: board of the player to move
+            temp: temperature for MCTS.getActionProb, 1 if
+                  episodeStep < tempThreshold, else 0
+        """
+        self.episodeStep += 1
+        canonicalBoard = self.game.getCanonicalForm(self.board, self.curPlayer)
+        temp = int(self.episodeStep < self.args.tempThreshold)
+        return canonicalBoard, temp
+
+    def play(self, canonicalBoard, pi):
+        """
+        Adds the symmetric forms of canonicalBoard with the MCTS policy pi to
+        the examples, or canonicalBoard alone with args.augmentSymmetries,
+        and plays an action sampled from pi. The examples keep pi as a
+        SparsePolicy with args.sparsePolicies.
+        """
+        if getattr(self.args, 'augmentSymmetries', False):
+            # the network trains on random symmetric forms instead, see NeuralNet.train
+            sym = [(canonicalBoard, pi)]
+        else:
+            sym = self.game.getSymmetries(canonicalBoard, pi)
+        sparse = getattr(self.args, 'sparsePolicies', False)
+        for b, p in sym:
+            self.trainExamples.append([b, self.curPlayer, SparsePolicy.fromDense(p) if sparse else p, None])
+
+        action = np.random.choice(len(pi), p=pi)
+        self.board, nextPlayer = self.game.getNextState(self.board, self.curPlayer, action)
+
+        result = self.game.getGameEnded(self.board, self.curPlayer)
+        if result == 1:
+            self.results[self.curPlayer + 1] = 1
+            self.ended = True
+        elif self.game.getGameEnded(self.board, nextPlayer) != 0:
+            self.ended = True
+        else:
+            self.curPlayer = nextPlayer
+
+    def getExamples(self):
+        """
+        Returns:
+            trainExamples: the examples of the ended game in the form
+                           (canonicalBoard, pi, v), see Coach.executeEpisode
+        """
+        return [(x[0], x[2], self.results[x[1] + 1]) for x in self.trainExamples]
+
+
+class _MCTSArenaPlayers():
+    """
+    Picklable player factory for Arena, building the greedy MCTS players of
+    the previous and the new network from their checkpoints.
+    """
+
+    def __init__(self, game, nnetClass, args, folder, prevFilename, newFilename):
+        self.game = game
+        self.nnetClass = nnetClass
+        self.args = args
+        self.folder = folder
+        self.prevFilename = prevFilename
+        self.newFilename = newFilename
+
+    def __call__(self):
+        players = []
+        for filename in [self.prevFilename, self.newFilename]:
+            nnet = self.nnetClass(self.game)
+            nnet.load_checkpoint(folder=self.folder, filename=filename)
+            mcts = MCTS(self.game, nnet, self.args)
+            players.append(lambda x, mcts=mcts: np.argmax(mcts.getActionProb(x, temp=0)))
+        return tuple(players)
+
+
+def _executeSelfPlayEpisode(seed):
+    np.random.seed(seed)
+    _selfPlayCoach.mcts = MCTS(_selfPlayCoach.game, _selfPlayCoach.selfPlayNet, _selfPlayCoach.args)  # reset search tree
+    return _selfPlayCoach.executeEpisode()
+
 
 class Coach():
     """
@@ -23,9 +136,15 @@ class Coach():
     def __init__(self, game, nnet, args):
         self.game = game
         self.nnet = nnet
-        self.pnet = self.nnet.__class__(self.game)  # the competitor network
+        self.pnet = None  # the competitor network, created by learn()
         self.args = args
-        self.mcts = MCTS(self.game, self.nnet, self.args)
+        # self-play evaluates boards through a cache shared by its episodes, if args.evaluationCacheSize is set
+        cacheSize = getattr(self.args, 'evaluationCacheSize', None)
+        self.selfPlayNet = self.nnet
+        if cacheSize:
+            self.selfPlayNet = EvaluationCache(self.game, self.nnet, cacheSize,
+                                               symmetric=getattr(self.args, 'symmetricEvaluationCache', False))
+        self.mcts = MCTS(self.game, self.selfPlayNet, self.args)
         self.trainExamplesHistory = []  # history of examples from args.numItersForTrainExamplesHistory latest iterations
         self.skipFirstSelfPlay = False  # can be overriden in loadTrainExamples()
 
@@ -45,34 +164,60 @@ class Coach():
                            pi is the MCTS informed policy vector, v is +1 if
                            the player eventually won the game, else -1.
         """
-        trainExamples = []
-        board = self.game.getInitBoard()
-        curPlayer = 1
-        episodeStep = 0
+        episode = SelfPlayEpisode(self.game, self.args)
+        while not episode.ended:
+            canonicalBoard, temp = episode.nextTurn()
+            pi = self.mcts.getActionProb(canonicalBoard, temp=temp)
+            episode.play(canonicalBoard, pi)
 
-        results = [-1, None, -1]
-        while True:
-            episodeStep += 1
-            canonicalBoard = self.game.getCanonicalForm(board, curPlayer)
-            temp = int(episodeStep < self.args.tempThreshold)
+        return episode.getExamples()
 
-            pi = self.mcts.getActionProb(canonicalBoard, temp=temp)
-            sym = self.game.getSymmetries(canonicalBoard, pi)
-            for b, p in sym:
-                trainExamples.append([b, curPlayer, p, None])
+    def executeEpisodesLockstep(self, numEpisodes):
+        """
+        Plays numEpisodes self-play episodes at once, each with its own MCTS
+        tree. At every simulation step the leaves of all the trees are
+        evaluated with a single nnet.predict_batch call (searchBatchSize leaves
+        per tree, see MCTS.gatherLeaves).
 
-            action = np.random.choice(len(pi), p=pi)
-            board, nextPlayer = self.game.getNextState(board, curPlayer, action)
+        Returns:
+            episodeExamples: a list with the trainExamples of every episode,
+                             each in the format returned by executeEpisode
+        """
+        batchSize = getattr(self.args, 'searchBatchSize', 1)
+        episodes = [SelfPlayEpisode(self.game, self.args) for _ in range(numEpisodes)]
+        searches = [MCTS(self.game, self.selfPlayNet, self.args) for _ in range(numEpisodes)]
+        episodeExamples = []
+        while episodes:
+            turns = [episode.nextTurn() for episode in episodes]
+            roots = [mcts.getRoot(canonicalBoard) for mcts, (canonicalBoard, _) in zip(searches, turns)]
+            sims = [0] * len(episodes)
+            while min(sims) < self.args.numMCTSSims:
+                pending = []
+                for i, (mcts, (canonicalBoard, _), root) in enumerate(zip(searches, turns, roots)):
+                    if sims[i] < self.args.numMCTSSims:
+                        leaves, terminalSims = mcts.gatherLeaves(canonicalBoard, root,
+                                                                 min(batchSize, self.args.numMCTSSims - sims[i]))
+                        sims[i] += terminalSims + len(leaves)
+                        if leaves:
+                            pending.append((mcts, leaves))
+                if not pending:
+                    continue
+
+                pis, vs = predictBoards(self.selfPlayNet, [board for _, leaves in pending
+                                                           for _, _, board in leaves])
+                start = 0
+                for mcts, leaves in pending:
+                    mcts.backupLeaves(leaves, pis[start:start + len(leaves)], vs[start:start + len(leaves)])
+                    start += len(leaves)
 
-            result = self.game.getGameEnded(board, curPlayer)
-            if result == 1:
-                results[curPlayer + 1] = 1
-                break
-            elif self.game.getGameEnded(board, nextPlayer) != 0:
-                break
-            curPlayer = nextPlayer
+            for episode, mcts, (canonicalBoard, temp), root in zip(episodes, searches, turns, roots):
+                episode.play(canonicalBoard, mcts.getNodeActionProb(root, temp))
+                if episode.ended:
+                    episodeExamples.append(episode.getExamples())
+            searches = [mcts for episode, mcts in zip(episodes, searches) if not episode.ended]
+            episodes = [episode for episode in episodes if not episode.ended]
 
-        return [(x[0], x[2], results[x[1] + 1]) for x in trainExamples]
+        return episodeExamples
 
     def learn(self):
         """
@@ -90,12 +235,25 @@ class Coach():
             if not self.skipFirstSelfPlay or i > 1:
                 iterationTrainExamples = deque([], maxlen=self.args.maxlenOfQueue)
 
-                for _ in tqdm(range(self.args.numEps), desc="Self Play"):
-                    self.mcts = MCTS(self.game, self.nnet, self.args)  # reset search tree
-                    iterationTrainExamples += self.executeEpisode()
+                if getattr(self.args, 'numSelfPlayWorkers', 1) > 1:
+                    for episodeExamples in self.selfPlayParallel(i):
+                        iterationTrainExamples += episodeExamples
+                elif getattr(self.args, 'numLockstepEpisodes', 1) > 1:
+                    with tqdm(total=self.args.numEps, desc="Self Play") as progress:
+                        for start in range(0, self.args.numEps, self.args.numLockstepEpisodes):
+                            count = min(self.args.numLockstepEpisodes, self.args.numEps - start)
+                            for episodeExamples in self.executeEpisodesLockstep(count):
+                                iterationTrainExamples += episodeExamples
+                            progress.update(count)
+                else:
+                    for _ in tqdm(range(self.args.numEps), desc="Self Play"):
+                        self.mcts = MCTS(self.game, self.selfPlayNet, self.args)  # reset search tree
+                        iterationTrainExamples += self.executeEpisode()
 
                 # save the iteration examples to the history 
                 self.trainExamplesHistory.append(iterationTrainExamples)
+                if isinstance(self.selfPlayNet, EvaluationCache):
+                    log.info(f'Evaluation cache: {self.selfPlayNet.getStats()}')
 
             if len(self.trainExamplesHistory) > self.args.numItersForTrainExamplesHistory:
                 log.warning(
@@ -112,17 +270,27 @@ class Coach():
             shuffle(trainExamples)
 
             # training new network, keeping a copy of the old one
+            if self.pnet is None:
+                self.pnet = self.nnet.__class__(self.game)
             self.nnet.save_checkpoint(folder=self.args.checkpoint, filename='temp.pth.tar')
             self.pnet.load_checkpoint(folder=self.args.checkpoint, filename='temp.pth.tar')
             pmcts = MCTS(self.game, self.pnet, self.args)
 
-            self.nnet.train(trainExamples)
+            if getattr(self.args, 'augmentSymmetries', False):
+                self.nnet.train(trainExamples, augment=True)
+            else:
+                self.nnet.train(trainExamples)
             nmcts = MCTS(self.game, self.nnet, self.args)
 
             log.info('PITTING AGAINST PREVIOUS VERSION')
+            numArenaWorkers = getattr(self.args, 'numArenaWorkers', 1)
+            if numArenaWorkers > 1:
+                self.nnet.save_checkpoint(folder=self.args.checkpoint, filename='arena.pth.tar')
             arena = Arena(lambda x: np.argmax(pmcts.getActionProb(x, temp=0)),
-                          lambda x: np.argmax(nmcts.getActionProb(x, temp=0)), self.game)
-            pwins, nwins, draws = arena.playGames(self.args.arenaCompare)
+                          lambda x: np.argmax(nmcts.getActionProb(x, temp=0)), self.game,
+                          playerFactory=_MCTSArenaPlayers(self.game, self.nnet.__class__, self.args,
+                                                          self.args.checkpoint, 'temp.pth.tar', 'arena.pth.tar'))
+            pwins, nwins, draws = arena.playGames(self.args.arenaCompare, numWorkers=numArenaWorkers)
 
             log.info('NEW/PREV WINS : %d / %d ; DRAWS : %d' % (nwins, pwins, draws))
             if pwins + nwins == 0 or float(nwins) / (pwins + nwins) < self.args.updateThreshold:
@@ -132,18 +300,84 @@ class Coach():
                 log.info('ACCEPTING NEW MODEL')
                 self.nnet.save_checkpoint(folder=self.args.checkpoint, filename=self.getCheckpointFile(i))
                 self.nnet.save_checkpoint(folder=self.args.checkpoint, filename='best.pth.tar')
+                if isinstance(self.selfPlayNet, EvaluationCache):
+                    # a rejected model is replaced by the previous one, whose evaluations stay valid
+                    self.selfPlayNet.setModelVersion(i)
+
+    def selfPlayParallel(self, iteration):
+        """
+        Plays the numEps self-play episodes of an iteration in a pool of
+        numSelfPlayWorkers processes. Every worker loads the current network
+        from a checkpoint once and then plays episodes with executeEpisode.
+        With args.inferenceServer the workers share a single copy of the
+        network in an InferenceServer process instead.
+
+        Episode e of the iteration is played with the numpy seed
+        (seed, iteration, e), so the games only depend on args.seed and not on
+        which worker plays them. Without args.seed the base seed is drawn from
+        numpy's global generator.
+
+        Yields:
+            episodeExamples: the examples of every episode, in episode order,
+                             as soon as they are available
+        """
+        self.nnet.save_checkpoint(folder=self.args.checkpoint, filename='selfplay.pth.tar')
+        seed = getattr(self.args, 'seed', None)
+        if seed is None:
+            seed = np.random.randint(2 ** 31)
+        seeds = [[seed, iteration, e] for e in range(self.args.numEps)]
+
+        server = None
+        if getattr(self.args, 'inferenceServer', False):
+            server = InferenceServer(self.game, self.nnet.__class__, self.args.checkpoint, 'selfplay.pth.tar',
+                                     self.args.numSelfPlayWorkers,
+                                     maxBoardsPerRequest=getattr(self.args, 'searchBatchSize', 1),
+                                     maxBatchSize=getattr(self.args, 'inferenceBatchSize', None),
+                                     maxWait=getattr(self.args, 'inferenceMaxWait', 0.005))
+            server.start()
+
+        # spawn, as forked processes can deadlock in CUDA and the threaded framework runtimes
+        context = multiprocessing.get_context('spawn')
+        try:
+            with context.Pool(self.args.numSelfPlayWorkers, initializer=_initSelfPlayWorker,
+                              initargs=(self.game, self.nnet.__class__, self.args, self.args.checkpoint,
+                                        'selfplay.pth.tar', server.client if server else None)) as pool:
+                for episodeExamples in tqdm(pool.imap(_executeSelfPlayEpisode, seeds), total=self.args.numEps,
+                                            desc="Self Play"):
+                    yield episodeExamples
+        finally:
+            if server:
+                server.stop()
 
     def getCheckpointFile(self, iteration):
         return 'checkpoint_' + str(iteration) + '.pth.tar'
 
     def saveTrainExamples(self, iteration):
+        """
+        Saves the history of examples in an ExampleStore in args.checkpoint.
+        The examples of new iterations are written to new shards and
+        replaced in the history by the memory mapped shards, the shards of
+        previous iterations are only listed in the index file of iteration.
+        Shards that dropped out of the history are deleted.
+
+        Histories with boards the store can not hold (boards that are not
+        numpy arrays of the same shape) are pickled instead.
+        """
         folder = self.args.checkpoint
         if not os.path.exists(folder):
             os.makedirs(folder)
-        filename = os.path.join(folder, self.getCheckpointFile(iteration) + ".examples")
-        with open(filename, "wb+") as f:
-            Pickler(f).dump(self.trainExamplesHistory)
-        f.closed
+        filename = self.getCheckpointFile(iteration) + ".examples"
+        store = ExampleStore(folder)
+        try:
+            history = [examples if isinstance(examples, ExampleShard) else store.addShard(examples)
+                       for examples in self.trainExamplesHistory]
+        except ValueError:
+            with open(os.path.join(folder, filename), "wb+") as f:
+                Pickler(f).dump(self.trainExamplesHistory)
+            return
+        self.trainExamplesHistory = history
+        store.saveIndex(filename, self.trainExamplesHistory)
+        store.removeShards(self.trainExamplesHistory)
 
     def loadTrainExamples(self):
         modelFile = os.path.join(self.args.load_folder_file[0], self.args.load_folder_file[1])
@@ -155,8 +389,13 @@ class Coach():
                 sys.exit()
         else:
             log.info("File with trainExamples found. Loading it...")
-            with open(examplesFile, "rb") as f:
-                self.trainExamplesHistory = Unpickler(f).load()
+            try:
+                store = ExampleStore(self.args.load_folder_file[0])
+                self.trainExamplesHistory = store.loadIndex(self.args.load_folder_file[1] + ".examples")
+            except ValueError:
+                # a pickled history, saved before the ExampleStore
+                with open(examplesFile, "rb") as f:
+                    self.trainExamplesHistory = Unpickler(f).load()
             log.info('Loading done!')
 
             # examples based on the model were already collected (loaded)
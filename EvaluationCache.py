@@ -0,0 +1,106 @@
+from collections import OrderedDict
+
+import numpy as np
+
+from NeuralNet import NeuralNet
+from utils import predictBoards
+
+
+class EvaluationCache(NeuralNet):
+    """
+    This class keeps the (pi, v) predicted by a neural network for the
+    boards it evaluated, so boards reached again (e.g. the openings of every
+    self-play game) are not evaluated again. It implements the NeuralNet
+    predict interface, so it can be handed to MCTS in place of the network,
+    and it outlives the MCTS trees of single episodes.
+
+    Boards are keyed by game.getHashKey or else stringRepresentation. At
+    most maxEntries predictions are kept, the least recently used one is
+    evicted first. The predictions belong to the model version set with
+    setModelVersion; setting a new version drops them all.
+
+    With symmetric, boards are evaluated and keyed in the symmetrical form
+    returned by game.getSymmetricCanonicalForm, so all the symmetrical forms
+    of a board share one prediction, whose policy is permuted back for
+    every board.
+    """
+
+    def __init__(self, game, nnet, maxEntries, modelVersion=0, symmetric=False):
+        """
+        Input:
+            game: Game object
+            nnet: NeuralNet evaluating the boards missing from the cache
+            maxEntries: number of predictions kept
+            modelVersion: version of the model of nnet
+            symmetric: whether symmetrical forms of a board share their
+                       prediction, if the game supports it
+        """
+        self.game = game
+        self.nnet = nnet
+        self.maxEntries = maxEntries
+        self.modelVersion = modelVersion
+        self.hashKeys = self.game.getHashKey(self.game.getInitBoard()) is not None
+        self.symmetric = symmetric and self.game.getSymmetricCanonicalForm(self.game.getInitBoard()) is not None
+        self.entries = OrderedDict()  # maps a board key to its (pi, v), least recently used first
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    def getKey(self, board):
+        return self.game.getHashKey(board) if self.hashKeys else self.game.stringRepresentation(board)
+
+    def setModelVersion(self, modelVersion):
+        """
+        Sets the version of the model of nnet, e.g. after it was replaced by
+        a new model. The predictions of other versions are dropped.
+        """
+        if modelVersion != self.modelVersion:
+            self.invalidations += len(self.entries)
+            self.entries.clear()
+            self.modelVersion = modelVersion
+
+    def getStats(self):
+        """
+        Returns:
+            stats: dict with the hits, misses, evictions and invalidations
+                   (predictions dropped by setModelVersion) of the cache,
+                   its current number of entries and model version
+        """
+        return {'hits': self.hits, 'misses': self.misses, 'evictions': self.evictions,
+                'invalidations': self.invalidations, 'entries': len(self.entries),
+                'modelVersion': self.modelVersion}
+
+    def predict(self, board):
+        pis, vs = self.predict_batch([board])
+        return pis[0], vs[0]
+
+    def predict_batch(self, boards):
+        permutations = None
+        if self.symmetric:
+            boards, permutations = zip(*[self.game.getSymmetricCanonicalForm(board) for board in boards])
+        keys = [self.getKey(board) for board in boards]
+        results = [self.entries.get(key) for key in keys]
+        missing = {}  # key of a missing board to the index of its first occurrence
+        for i, (key, result) in enumerate(zip(keys, results)):
+            if result is None:
+                missing.setdefault(key, i)
+            else:
+                self.entries.move_to_end(key)
+        self.hits += len(keys) - len(missing)
+        self.misses += len(missing)
+
+        if missing:
+            pis, vs = predictBoards(self.nnet, [boards[i] for i in missing.values()])
+            for key, pi, v in zip(missing, pis, vs):
+                self.entries[key] = (np.copy(pi), v)
+            while len(self.entries) > self.maxEntries:
+                self.entries.popitem(last=False)
+                self.evictions += 1
+            evaluated = dict(zip(missing, zip(pis, vs)))
+            results = [evaluated[key] if result is None else result for key, result in zip(keys, results)]
+
+        pis, vs = zip(*results)
+        if permutations:
+            pis = [pi[permutation] for pi, permutation in zip(pis, permutations)]
+        return np.array(pis), np.array(vs)
@@ -0,0 +1,140 @@
+import json
+import os
+import shutil
+
+import numpy as np
+
+from utils import SparsePolicy
+
+SHARD_FOLDER = 'shards'  # folder of the shards, in the folder of the store
+# sparse policies are stored in the rows piOffsets[i]:piOffsets[i+1] of piIndices and piProbabilities
+SPARSE_COLUMNS = ['piIndices', 'piProbabilities', 'piOffsets']
+
+
+class ExampleShard():
+    """
+    This class holds the training examples of one iteration, read back
+    memory mapped from the .npy files of their boards, policies and values.
+    It is a sequence of (board, pi, v) examples, so it can be used in place
+    of the list of examples it was written from. Policies written as
+    SparsePolicy are read back as SparsePolicy.
+    """
+
+    def __init__(self, folder):
+        self.folder = folder
+        self.boards, self.vs = [self.loadColumn(column) for column in ['boards', 'vs']]
+        self.pis = None
+        if os.path.exists(os.path.join(folder, 'pis.npy')):
+            self.pis = self.loadColumn('pis')
+        else:
+            self.piIndices, self.piProbabilities, self.piOffsets = [self.loadColumn(column)
+                                                                    for column in SPARSE_COLUMNS]
+            self.piSize = int(np.load(os.path.join(folder, 'piSize.npy')))
+
+    def loadColumn(self, column):
+        return np.load(os.path.join(self.folder, column + '.npy'), mmap_mode='r')
+
+    def __len__(self):
+        return len(self.vs)
+
+    def __getitem__(self, index):
+        if self.pis is not None:
+            return self.boards[index], self.pis[index], self.vs[index]
+        index = range(len(self))[index]
+        start, end = self.piOffsets[index], self.piOffsets[index + 1]
+        pi = SparsePolicy(self.piIndices[start:end], self.piProbabilities[start:end], self.piSize)
+        return self.boards[index], pi, self.vs[index]
+
+
+class ExampleStore():
+    """
+    This class stores the training examples of every iteration in a shard,
+    a folder with the boards, policies and values in separate .npy files.
+    Shards are written once and never modified, so saving an iteration only
+    writes its new examples. An index file lists the shards of a history
+    (e.g. the numItersForTrainExamplesHistory latest iterations), loading it
+    memory maps them without reading the examples.
+
+    Boards must be numpy arrays of the same shape. Policies and values are
+    stored as float32, the precision the networks train with, and the
+    SparsePolicy policies of a shard only store their non-zero entries.
+    """
+
+    def __init__(self, folder):
+        """
+        Input:
+            folder: folder of the index files, the shards are in its
+                    SHARD_FOLDER subfolder
+        """
+        self.folder = folder
+
+    def addShard(self, examples):
+        """
+        Input:
+            examples: sequence of (board, pi, v) examples
+
+        Returns:
+            shard: the ExampleShard of the examples, written to a new shard
+        """
+        boards = np.array([board for board, _, _ in examples])
+        if boards.dtype == object:
+            raise ValueError('only boards that are numpy arrays of the same shape can be stored')
+        columns = {'boards': boards, 'vs': np.array([v for _, _, v in examples], dtype=np.float32)}
+        pis = [pi for _, pi, _ in examples]
+        if len(pis) and isinstance(pis[0], SparsePolicy):
+            columns['piIndices'] = np.concatenate([pi.indices for pi in pis]).astype(np.int32)
+            columns['piProbabilities'] = np.concatenate([pi.probabilities for pi in pis]).astype(np.float32)
+            columns['piOffsets'] = np.cumsum([0] + [len(pi.indices) for pi in pis])
+            columns['piSize'] = np.array(pis[0].size)
+        else:
+            columns['pis'] = np.array(pis, dtype=np.float32)
+
+        shardsFolder = os.path.join(self.folder, SHARD_FOLDER)
+        os.makedirs(shardsFolder, exist_ok=True)
+        name = str(1 + max([int(n) for n in os.listdir(shardsFolder) if n.isdigit()], default=-1))
+        # written next to the shard and renamed, so a shard is either complete or missing
+        temporary = os.path.join(shardsFolder, name + '.tmp')
+        os.makedirs(temporary, exist_ok=True)
+        for column, values in columns.items():
+            np.save(os.path.join(temporary, column + '.npy'), values)
+        os.replace(temporary, os.path.join(shardsFolder, name))
+        return ExampleShard(os.path.join(shardsFolder, name))
+
+    def saveIndex(self, filename, shards):
+        """
+        Writes the index file filename listing the shards, which must be
+        shards of this store.
+        """
+        index = {'shards': [os.path.relpath(shard.folder, self.folder) for shard in shards],
+                 'counts': [len(shard) for shard in shards]}
+        path = os.path.join(self.folder, filename)
+        with open(path + '.tmp', 'w') as f:
+            json.dump(index, f)
+        os.replace(path + '.tmp', path)
+
+    def removeShards(self, keep):
+        """
+        Deletes the shards of this store that are not in keep, e.g. the
+        shards of iterations older than the history listed by the newest
+        index file. Index files listing deleted shards can not be loaded.
+        """
+        shardsFolder = os.path.join(self.folder, SHARD_FOLDER)
+        if not os.path.isdir(shardsFolder):
+            return
+        kept = set(os.path.abspath(shard.folder) for shard in keep)
+        for name in os.listdir(shardsFolder):
+            folder = os.path.join(shardsFolder, name)
+            if name.isdigit() and os.path.abspath(folder) not in kept:
+                shutil.rmtree(folder)
+
+    def loadIndex(self, filename):
+        """
+        Returns:
+            shards: the memory mapped ExampleShard of every shard listed in
+                    the index file filename
+
+        Raises a ValueError if filename is not an index file.
+        """
+        with open(os.path.join(self.folder, filename), 'rb') as f:
+            index = json.loads(f.read().decode('utf-8'))
+        return [ExampleShard(os.path.join(self.folder, shard)) for shard in index['shards']]
@@ -1,3 +1,6 @@
+import numpy as np
+
+
 class Game():
     """
     This class specifies the base Game class. To define your own game, subclass
@@ -101,6 +104,44 @@ class Game():
         """
         pass
 
+    def getSymmetriesBatch(self, boards, pis):
+        """
+        Input:
+            boards: numpy array of boards stacked along the first axis
+            pis: numpy array of their policy vectors
+
+        Returns:
+            symmBoards: numpy array of shape (numSymmetries,) + boards.shape
+                        where symmBoards[s] holds the s-th symmetrical form
+                        of every board, as listed by getSymmetries
+            symmPis: numpy array of shape (numSymmetries,) + pis.shape with
+                     the corresponding pi vectors
+
+        The default implementation calls getSymmetries on every board; games
+        can override it with SymmetryTables (see utils).
+        """
+        symmetries = [self.getSymmetries(board, pi) for board, pi in zip(boards, pis)]
+        return (np.array([[board for board, _ in symms] for symms in symmetries]).swapaxes(0, 1),
+                np.array([[pi for _, pi in symms] for symms in symmetries]).swapaxes(0, 1))
+
+    def getSymmetricCanonicalForm(self, board):
+        """
+        Optional. Games with numpy boards can return
+        utils.symmetricCanonicalForm(self, board).
+
+        Input:
+            board: current board in its canonical form
+
+        Returns:
+            (symmetricBoard, permutation): symmetricBoard is the symmetrical
+                       form of board chosen for all the symmetrical forms of
+                       board, and permutation maps the policy of
+                       symmetricBoard to the policy of board:
+                       pi = symmetricPi[permutation]. None if the game does
+                       not support it.
+        """
+        return None
+
     def stringRepresentation(self, board):
         """
         Input:
@@ -111,3 +152,46 @@ class Game():
                          Required by MCTS for hashing.
         """
         pass
+
+    def getHashKey(self, board):
+        """
+        Optional. Games returning a key here also implement
+        getNextStateWithKey and getCanonicalHashKey, see ZobristHash in utils.
+
+        Input:
+            board: current board
+
+        Returns:
+            key: an integer key of the board (e.g. a Zobrist hash) or None
+                 if the game does not support hashing. MCTS keys its tables
+                 with it instead of stringRepresentation.
+        """
+        return None
+
+    def getNextStateWithKey(self, board, player, action, key):
+        """
+        Input:
+            board: current board
+            player: current player (1 or -1)
+            action: action taken by current player
+            key: getHashKey(board)
+
+        Returns:
+            nextBoard, nextPlayer: as returned by getNextState
+            nextKey: getHashKey(nextBoard), ideally updated incrementally
+                     from key with the squares changed by the action
+        """
+        nextBoard, nextPlayer = self.getNextState(board, player, action)
+        return nextBoard, nextPlayer, self.getHashKey(nextBoard)
+
+    def getCanonicalHashKey(self, board, key, player):
+        """
+        Input:
+            board: current board
+            key: getHashKey(board)
+            player: current player (1 or -1)
+
+        Returns:
+            canonicalKey: getHashKey(getCanonicalForm(board, player))
+        """
+        return self.getHashKey(self.getCanonicalForm(board, player))
@@ -0,0 +1,246 @@
+import logging
+import multiprocessing
+import multiprocessing.connection
+import queue
+import threading
+import time
+
+import numpy as np
+
+from NeuralNet import NeuralNet
+from utils import stackBoards
+
+log = logging.getLogger(__name__)
+
+POLL_INTERVAL = 1.0  # seconds between checks that the server process is still running
+
+
+class InferenceServer():
+    """
+    This class runs a single copy of a neural network in its own process and
+    evaluates the boards submitted by the InferenceClient of other processes
+    (e.g. parallel self-play workers) in shared batches.
+
+    Every client owns a slot in shared memory arrays where it writes its
+    boards and reads back the predictions, so only (slot, count) tuples go
+    through the request queue. The server starts a batch with the first
+    pending request and keeps adding requests until maxBatchSize boards are
+    gathered, every client is waiting, or maxWait seconds have passed.
+
+    If the server process exits before stop() is called (e.g. it fails to
+    load the checkpoint or runs out of memory), waiting clients and stop()
+    raise a RuntimeError instead of blocking forever.
+    """
+
+    def __init__(self, game, nnetClass, folder, filename, numClients, maxBoardsPerRequest=1, maxBatchSize=None,
+                 maxWait=0.005):
+        """
+        Input:
+            game: Game object
+            nnetClass: NeuralNet subclass, instantiated as nnetClass(game) in
+                       the server process
+            folder, filename: checkpoint loaded into the network
+            numClients: number of processes that will use the client
+            maxBoardsPerRequest: size of the shared memory slot of a client,
+                                 larger predict_batch calls are split
+            maxBatchSize: number of boards that triggers a batch without
+                          waiting, defaults to numClients * maxBoardsPerRequest
+            maxWait: seconds a batch waits for more requests after its first one
+        """
+        self.game = game
+        self.nnetClass = nnetClass
+        self.folder = folder
+        self.filename = filename
+        self.numClients = numClients
+        self.maxBoardsPerRequest = maxBoardsPerRequest
+        self.maxBatchSize = maxBatchSize or numClients * maxBoardsPerRequest
+        self.maxWait = maxWait
+        self.process = None
+        self.stopping = False
+
+        # spawn, as forked processes can deadlock in CUDA and the threaded framework runtimes
+        self.context = multiprocessing.get_context('spawn')
+        board = stackBoards([game.getInitBoard()])
+        if board is None:
+            raise ValueError('the inference server only evaluates boards that numpy converts to arrays')
+        board = board[0]
+        slotShape = (numClients, maxBoardsPerRequest)
+        self.buffers = SharedBuffers(self.context, slotShape, board.shape, board.dtype, game.getActionSize())
+        self.requests = self.context.Queue()
+        self.stats = self.context.Queue()
+        self.client = InferenceClient(self.buffers, self.requests, [self.context.Event() for _ in range(numClients)],
+                                      self.context.Queue(), self.context.Event())
+        for slot in range(numClients):
+            self.client.freeSlots.put(slot)
+
+    def start(self):
+        self.process = self.context.Process(target=_serve, args=(self.game, self.nnetClass, self.folder,
+                                                                 self.filename, self.buffers, self.requests,
+                                                                 self.client.ready, self.numClients,
+                                                                 self.maxBatchSize, self.maxWait, self.stats))
+        self.process.start()
+        self.stopping = False
+        threading.Thread(target=self._watch, args=(self.process,), daemon=True).start()
+
+    def _watch(self, process):
+        # tells the clients when the server process exits without being stopped
+        multiprocessing.connection.wait([process.sentinel])
+        if not self.stopping:
+            self.client.failed.set()
+
+    def stop(self):
+        """
+        Stops the server process after the pending requests are served.
+
+        Returns:
+            stats: a dict with the number of batches, requests and boards, the
+                   mean batch size, the mean batch fill (batch size divided by
+                   maxBatchSize) and the mean and max request latency in
+                   seconds, measured from submission to the result being ready
+        """
+        self.stopping = True
+        self.requests.put(None)
+        while True:
+            try:
+                stats = self.stats.get(timeout=POLL_INTERVAL)
+                break
+            except queue.Empty:
+                if not self.process.is_alive() and self.stats.empty():
+                    exitcode = self.process.exitcode
+                    self.process = None
+                    raise RuntimeError('Inference server process exited with code %s' % exitcode)
+        self.process.join()
+        self.process = None
+        log.info('Inference server: %d batches, mean size %.1f, mean fill %.0f%%, latency mean %.1f ms max %.1f ms',
+                 stats['batches'], stats['meanBatchSize'], 100 * stats['meanFill'], 1000 * stats['meanLatency'],
+                 1000 * stats['maxLatency'])
+        return stats
+
+
+class SharedBuffers():
+    """
+    Shared memory arrays holding the boards and predictions of every client
+    slot. Pickling only works while spawning processes, after which every
+    process creates its own numpy views of the same memory.
+    """
+
+    def __init__(self, context, slotShape, boardShape, boardDtype, actionSize):
+        self.shapes = (slotShape + boardShape, slotShape + (actionSize,), slotShape)
+        self.dtypes = (np.dtype(boardDtype), np.dtype(np.float32), np.dtype(np.float32))
+        self.raw = [context.RawArray('b', int(np.prod(shape)) * dtype.itemsize)
+                    for shape, dtype in zip(self.shapes, self.dtypes)]
+        self.views = None
+
+    def __getstate__(self):
+        return {'shapes': self.shapes, 'dtypes': self.dtypes, 'raw': self.raw, 'views': None}
+
+    def arrays(self):
+        """
+        Returns:
+            boards, pis, vs: numpy views of the shared memory, indexed by slot
+        """
+        if self.views is None:
+            self.views = [np.frombuffer(raw, dtype=dtype).reshape(shape)
+                          for raw, shape, dtype in zip(self.raw, self.shapes, self.dtypes)]
+        return self.views
+
+
+class InferenceClient(NeuralNet):
+    """
+    Evaluates boards on an InferenceServer through the NeuralNet predict
+    interface, so it can be handed to MCTS in place of a network. Every
+    process using the client takes one of the server's slots on its first
+    call.
+    """
+
+    def __init__(self, buffers, requests, ready, freeSlots, failed):
+        self.buffers = buffers
+        self.requests = requests
+        self.ready = ready
+        self.freeSlots = freeSlots
+        self.failed = failed  # set when the server process exits unexpectedly
+        self.slot = None
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state['slot'] = None
+        return state
+
+    def predict(self, board):
+        pis, vs = self.predict_batch([board])
+        return pis[0], vs[0]
+
+    def predict_batch(self, boards):
+        if self.slot is None:
+            self.slot = self.freeSlots.get()
+        inputs, pis, vs = self.buffers.arrays()
+        inputs, pis, vs = inputs[self.slot], pis[self.slot], vs[self.slot]
+        size = len(inputs)
+
+        outPis = np.empty((len(boards), pis.shape[-1]), dtype=np.float32)
+        outVs = np.empty(len(boards), dtype=np.float32)
+        for start in range(0, len(boards), size):
+            count = min(size, len(boards) - start)
+            inputs[:count] = boards[start:start + count]
+            self.ready[self.slot].clear()
+            self.requests.put((self.slot, count, time.time()))
+            while not self.ready[self.slot].wait(POLL_INTERVAL):
+                if self.failed.is_set():
+                    raise RuntimeError('Inference server process exited unexpectedly')
+            outPis[start:start + count] = pis[:count]
+            outVs[start:start + count] = vs[:count]
+        return outPis, outVs
+
+
+def _serve(game, nnetClass, folder, filename, buffers, requests, ready, numClients, maxBatchSize, maxWait, stats):
+    nnet = nnetClass(game)
+    nnet.load_checkpoint(folder=folder, filename=filename)
+    inputs, pis, vs = buffers.arrays()
+
+    batches = requestCount = boardCount = 0
+    latencySum = latencyMax = 0.0
+    stopping = False
+    while not stopping:
+        request = requests.get()
+        if request is None:
+            break
+
+        # gather requests until the batch is full, every client waits or the deadline passes
+        batch = [request]
+        size = request[1]
+        deadline = time.time() + maxWait
+        while size < maxBatchSize and len(batch) < numClients:
+            try:
+                request = requests.get(timeout=max(deadline - time.time(), 0))
+            except queue.Empty:
+                break
+            if request is None:
+                stopping = True
+                break
+            batch.append(request)
+            size += request[1]
+
+        batchPis, batchVs = nnet.predict_batch(np.concatenate([inputs[slot, :count] for slot, count, _ in batch]))
+        start = 0
+        now = time.time()
+        for slot, count, submitted in batch:
+            pis[slot, :count] = batchPis[start:start + count]
+            vs[slot, :count] = batchVs[start:start + count]
+            start += count
+            ready[slot].set()
+            latencySum += now - submitted
+            latencyMax = max(latencyMax, now - submitted)
+
+        batches += 1
+        requestCount += len(batch)
+        boardCount += size
+
+    stats.put({
+        'batches': batches,
+        'requests': requestCount,
+        'boards': boardCount,
+        'meanBatchSize': boardCount / max(batches, 1),
+        'meanFill': boardCount / max(batches * maxBatchSize, 1),
+        'meanLatency': latencySum / max(requestCount, 1),
+        'maxLatency': latencyMax,
+    })
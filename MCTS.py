@@ -1,9 +1,15 @@
 import logging
 import math
+import sys
 
 import numpy as np
 
+from utils import predictBoards
+
 EPS = 1e-8
+INITIAL_CAPACITY = 16
+KEY_OVERHEAD = 48  # approximate bytes of the dict entry and list slot of a node key
+EVICTION_FRACTION = 8  # an eviction releases at least 1/EVICTION_FRACTION of the node budget
 
 log = logging.getLogger(__name__)
 
@@ -11,19 +17,245 @@ log = logging.getLogger(__name__)
 class MCTS():
     """
     This class handles the MCTS tree.
+
+    Every board reached by the search gets an integer node id. The statistics
+    of a node and of its outgoing edges are stored in row `node` of
+    preallocated numpy arrays, so a simulation indexes arrays instead of
+    hashing (board, action) tuples. Boards are only hashed the first time an
+    edge is traversed; afterwards the child id is read from self.children.
+    Games implementing Game.getHashKey are keyed by their hash keys, updated
+    incrementally along edges, instead of stringRepresentation.
+
+    With args.searchBatchSize > 1 the simulations are run in batches: several
+    paths are descended using virtual loss and their leaves are evaluated by a
+    single nnet.predict_batch call.
+
+    With args.reuseTree the subtree below each new root is kept and every
+    node that cannot be reached from it anymore is released, so the tree of
+    a long game (or of many games played with one MCTS) stays bounded.
+
+    With args.maxNodes or args.maxTreeBytes the tree is limited to a budget.
+    Before a simulation would exceed it, the nodes visited least recently
+    (args.evictionPolicy 'lru') or least often ('visits') are evicted and
+    their ids reused. An evicted board is expanded again when it is reached
+    anew. See getStats for the evictions and the current footprint.
     """
 
     def __init__(self, game, nnet, args):
         self.game = game
         self.nnet = nnet
         self.args = args
-        self.Qsa = {}  # stores Q values for s,a (as defined in the paper)
-        self.Nsa = {}  # stores #times edge s,a was visited
-        self.Ns = {}  # stores #times board s was visited
-        self.Ps = {}  # stores initial policy (returned by neural net)
+        self.actionSize = self.game.getActionSize()
+
+        self.nodes = {}  # maps the key of a board to its node id
+        self.keys = []  # key of every node: game.getHashKey or else stringRepresentation
+        self.hashKeys = self.game.getHashKey(self.game.getInitBoard()) is not None
+        self.nodeCount = 0
+        self.capacity = 0
+
+        self.Qsa = np.zeros((0, self.actionSize))  # stores Q values for s,a (as defined in the paper)
+        self.Nsa = np.zeros((0, self.actionSize), dtype=np.int32)  # stores #times edge s,a was visited
+        self.Ns = np.zeros(0, dtype=np.int64)  # stores #times board s was visited
+        self.Ps = np.zeros((0, self.actionSize))  # stores initial policy (returned by neural net)
+
+        self.Es = np.zeros(0)  # stores game.getGameEnded ended for board s
+        self.Vs = np.zeros((0, self.actionSize), dtype=bool)  # stores game.getValidMoves for board s
+        self.expanded = np.zeros(0, dtype=bool)  # whether Ps and Vs have been set for board s
+        self.children = np.zeros((0, self.actionSize), dtype=np.int32)  # node id reached by s,a or -1
+        self.VLsa = np.zeros((0, self.actionSize), dtype=np.int32)  # stores #pending paths through edge s,a
+        self.VLs = np.zeros(0, dtype=np.int32)  # stores #pending paths through board s
+        self.lastVisit = np.zeros(0, dtype=np.int64)  # simulation that last visited board s
+
+        self.simulations = 0
+        self.freeNodes = []  # ids of evicted nodes, reused by getNode
+        self.evictions = 0
+        self.evictionRounds = 0
+        self.evictionPolicy = getattr(self.args, 'evictionPolicy', 'lru')
+        assert self.evictionPolicy in ('lru', 'visits'), self.evictionPolicy
+        self.maxNodes = getattr(self.args, 'maxNodes', None)
+        maxTreeBytes = getattr(self.args, 'maxTreeBytes', None)
+        if maxTreeBytes is not None:
+            maxNodes = int(maxTreeBytes // self.getNodeBytes())
+            self.maxNodes = maxNodes if self.maxNodes is None else min(self.maxNodes, maxNodes)
+        assert self.maxNodes is None or self.maxNodes > 2 * getattr(self.args, 'searchBatchSize', 1), \
+            'the node budget must hold more than two batches'
+
+        self.grow(INITIAL_CAPACITY if self.maxNodes is None else min(INITIAL_CAPACITY, self.maxNodes))
+
+    def grow(self, capacity):
+        """
+        Reallocates the node arrays so that they can hold capacity nodes,
+        keeping the first nodeCount rows.
+        """
+
+        self.reallocate(capacity, np.arange(self.nodeCount))
+
+    def reallocate(self, capacity, order):
+        """
+        Reallocates the node arrays so that they can hold capacity nodes,
+        moving the rows of the nodes in order to the first rows. Node ids in
+        self.children are not renumbered.
+        """
+
+        def resize(array, fill=0):
+            resized = np.full((capacity,) + array.shape[1:], fill, dtype=array.dtype)
+            resized[:len(order)] = array[order]
+            return resized
+
+        self.Qsa = resize(self.Qsa)
+        self.Nsa = resize(self.Nsa)
+        self.Ns = resize(self.Ns)
+        self.Ps = resize(self.Ps)
+        self.Es = resize(self.Es)
+        self.Vs = resize(self.Vs)
+        self.expanded = resize(self.expanded)
+        self.children = resize(self.children, -1)
+        self.VLsa = resize(self.VLsa)
+        self.VLs = resize(self.VLs)
+        self.lastVisit = resize(self.lastVisit)
+        self.capacity = capacity
+
+    def getNodeBytes(self):
+        """
+        Returns:
+            bytes: approximate memory used by one node, its array rows and its
+                   key (measured on the initial board)
+        """
+        board = self.game.getInitBoard()
+        key = self.game.getHashKey(board) if self.hashKeys else self.game.stringRepresentation(board)
+        arrays = [self.Qsa, self.Nsa, self.Ns, self.Ps, self.Es, self.Vs, self.expanded, self.children, self.VLsa,
+                  self.VLs, self.lastVisit]
+        return sum(array.itemsize * int(np.prod(array.shape[1:])) for array in arrays) + \
+            sys.getsizeof(key) + KEY_OVERHEAD
+
+    def getStats(self):
+        """
+        Returns:
+            stats: a dict with the number of live nodes, the array capacity,
+                   the node budget (None if unbounded), the approximate
+                   footprint in bytes of the allocated nodes, and the number
+                   of evicted nodes and of eviction rounds
+        """
+        return {
+            'nodes': self.nodeCount - len(self.freeNodes),
+            'capacity': self.capacity,
+            'maxNodes': self.maxNodes,
+            'bytes': self.capacity * self.getNodeBytes(),
+            'evictions': self.evictions,
+            'evictionRounds': self.evictionRounds,
+        }
 
-        self.Es = {}  # stores game.getGameEnded ended for board s
-        self.Vs = {}  # stores game.getValidMoves for board s
+    def reserveNodes(self, count, root):
+        """
+        Makes room for count new nodes within the node budget, plus one for
+        the root of the next search, evicting nodes other than root if needed.
+        Must not be called while paths of a batch are pending.
+        """
+        if self.maxNodes is None:
+            return
+        liveNodes = self.nodeCount - len(self.freeNodes)
+        if liveNodes + count < self.maxNodes:
+            return
+
+        live = np.ones(self.nodeCount, dtype=bool)
+        live[self.freeNodes] = False
+        live[root] = False
+        candidates = np.flatnonzero(live)
+        scores = self.lastVisit[candidates] if self.evictionPolicy == 'lru' else self.Ns[candidates]
+        evictCount = min(len(candidates), max(liveNodes + count + 1 - self.maxNodes, self.maxNodes // EVICTION_FRACTION))
+        evicted = candidates[np.argpartition(scores, evictCount - 1)[:evictCount]]
+
+        for node in evicted:
+            del self.nodes[self.keys[node]]
+        self.Qsa[evicted] = 0
+        self.Nsa[evicted] = 0
+        self.Ns[evicted] = 0
+        self.Ps[evicted] = 0
+        self.Es[evicted] = 0
+        self.Vs[evicted] = False
+        self.expanded[evicted] = False
+        self.children[evicted] = -1
+        self.lastVisit[evicted] = 0
+        references = self.children[:self.nodeCount]
+        references[np.isin(references, evicted)] = -1
+        self.freeNodes.extend(evicted.tolist())
+        self.evictions += evictCount
+        self.evictionRounds += 1
+
+    def getNode(self, canonicalBoard, key=None):
+        """
+        Returns the node id of canonicalBoard, adding a new unexpanded node if
+        the board has not been seen before. key is the hash key of the board
+        if already known.
+        """
+        if key is not None:
+            s = key
+        elif self.hashKeys:
+            s = self.game.getHashKey(canonicalBoard)
+        else:
+            s = self.game.stringRepresentation(canonicalBoard)
+        node = self.nodes.get(s)
+        if node is not None:
+            return node
+
+        if self.freeNodes:
+            node = self.freeNodes.pop()
+            self.keys[node] = s
+        else:
+            if self.nodeCount == self.capacity:
+                self.grow(2 * self.capacity if self.maxNodes is None else min(2 * self.capacity, self.maxNodes))
+            node = self.nodeCount
+            self.nodeCount += 1
+            self.keys.append(s)
+        self.nodes[s] = node
+        self.Es[node] = self.game.getGameEnded(canonicalBoard, 1)
+        return node
+
+    def getRoot(self, canonicalBoard):
+        """
+        Returns the node id of canonicalBoard as the root of a new search,
+        first pruning the tree to its subtree if args.reuseTree is set.
+        """
+        root = self.getNode(canonicalBoard)
+        if getattr(self.args, 'reuseTree', False):
+            root = self.pruneTree(root)
+        return root
+
+    def pruneTree(self, root):
+        """
+        Releases every node that cannot be reached from root through the edges
+        traversed so far and renumbers the remaining nodes, keeping their
+        statistics. The arrays shrink when less than a quarter is used.
+
+        Returns:
+            root: the new node id of root
+        """
+        reachable = np.zeros(self.nodeCount, dtype=bool)
+        reachable[root] = True
+        frontier = np.array([root])
+        while len(frontier) > 0:
+            children = self.children[frontier].ravel()
+            children = np.unique(children[children >= 0])
+            frontier = children[~reachable[children]]
+            reachable[frontier] = True
+
+        order = np.flatnonzero(reachable)
+        if len(order) == self.nodeCount:
+            return root
+        renumber = np.full(self.nodeCount, -1, dtype=np.int32)
+        renumber[order] = np.arange(len(order))
+
+        capacity = self.capacity
+        while capacity > INITIAL_CAPACITY and 4 * len(order) <= capacity:
+            capacity //= 2
+        self.reallocate(capacity, order)
+        self.children[:len(order)] = np.where(self.children[:len(order)] >= 0,
+                                              renumber[self.children[:len(order)]], -1)
+        self.keys = [self.keys[node] for node in order]
+        self.nodes = {s: node for node, s in enumerate(self.keys)}
+        self.nodeCount = len(order)
+        self.freeNodes = []
+        return int(renumber[root])
 
     def getActionProb(self, canonicalBoard, temp=1):
         """
@@ -34,11 +266,27 @@ class MCTS():
             probs: a policy vector where the probability of the ith action is
                    proportional to Nsa[(s,a)]**(1./temp)
         """
-        for i in range(self.args.numMCTSSims):
-            self.search(canonicalBoard)
+        root = self.getRoot(canonicalBoard)
+        batchSize = getattr(self.args, 'searchBatchSize', 1)
+        if batchSize > 1:
+            sims = 0
+            while sims < self.args.numMCTSSims:
+                sims += self.searchBatch(canonicalBoard, root, min(batchSize, self.args.numMCTSSims - sims))
+        else:
+            for i in range(self.args.numMCTSSims):
+                self.reserveNodes(1, root)
+                self.simulations += 1
+                self.search(canonicalBoard, root)
 
-        s = self.game.stringRepresentation(canonicalBoard)
-        counts = [self.Nsa[(s, a)] if (s, a) in self.Nsa else 0 for a in range(self.game.getActionSize())]
+        return self.getNodeActionProb(root, temp)
+
+    def getNodeActionProb(self, node, temp=1):
+        """
+        Returns:
+            probs: the policy vector of getActionProb, computed from the
+                   current visit counts of node without further simulations
+        """
+        counts = self.Nsa[node]
 
         if temp == 0:
             bestAs = np.array(np.argwhere(counts == np.max(counts))).flatten()
@@ -47,12 +295,12 @@ class MCTS():
             probs[bestA] = 1
             return probs
 
-        counts = [x ** (1. / temp) for x in counts]
-        counts_sum = float(sum(counts))
-        probs = [x / counts_sum for x in counts]
-        return probs
+        counts = counts ** (1. / temp)
+        counts_sum = float(np.sum(counts))
+        probs = counts / counts_sum
+        return probs.tolist()
 
-    def search(self, canonicalBoard):
+    def search(self, canonicalBoard, node=None):
         """
         This function performs one iteration of MCTS. It is recursively called
         till a leaf node is found. The action chosen at each node is one that
@@ -68,69 +316,222 @@ class MCTS():
         state. This is done since v is in [-1,1] and if v is the value of a
         state for the current player, then its value is -v for the other player.
 
+        Input:
+            canonicalBoard: board to search from
+            node: node id of canonicalBoard, looked up when not given
+
         Returns:
             v: the negative of the value of the current canonicalBoard
         """
 
-        s = self.game.stringRepresentation(canonicalBoard)
+        if node is None:
+            node = self.getNode(canonicalBoard)
+        self.lastVisit[node] = self.simulations
 
-        if s not in self.Es:
-            self.Es[s] = self.game.getGameEnded(canonicalBoard, 1)
-        if self.Es[s] != 0:
+        if self.Es[node] != 0:
             # terminal node
-            return -self.Es[s]
+            return -self.Es[node]
 
-        if s not in self.Ps:
+        if not self.expanded[node]:
             # leaf node
-            self.Ps[s], v = self.nnet.predict(canonicalBoard)
-            valids = self.game.getValidMoves(canonicalBoard, 1)
-            self.Ps[s] = self.Ps[s] * valids  # masking invalid moves
-            sum_Ps_s = np.sum(self.Ps[s])
-            if sum_Ps_s > 0:
-                self.Ps[s] /= sum_Ps_s  # renormalize
-            else:
-                # if all valid moves were masked make all valid moves equally probable
+            pi, v = self.nnet.predict(canonicalBoard)
+            self.expand(node, canonicalBoard, pi)
+            return -float(v)
 
-                # NB! All valid moves may be masked if either your NNet architecture is insufficient or you've get overfitting or something else.
-                # If you have got dozens or hundreds of these messages you should pay attention to your NNet and/or training process.   
-                log.error("All valid moves were masked, doing a workaround.")
-                self.Ps[s] = self.Ps[s] + valids
-                self.Ps[s] /= np.sum(self.Ps[s])
+        if getattr(self.args, 'vectorizedSelection', True):
+            a = self.selectActionVectorized(node)
+        else:
+            a = self.selectAction(node)
+        next_s, child = self.getChild(node, canonicalBoard, a)
 
-            self.Vs[s] = valids
-            self.Ns[s] = 0
-            return -v
+        v = self.search(next_s, child)
 
-        valids = self.Vs[s]
-        cur_best = -float('inf')
-        best_act = -1
+        n = self.Nsa[node, a]
+        self.Qsa[node, a] = (n * self.Qsa[node, a] + v) / (n + 1)
+        self.Nsa[node, a] = n + 1
 
-        # pick the action with the highest upper confidence bound
-        for a in range(self.game.getActionSize()):
-            if valids[a]:
-                if (s, a) in self.Qsa:
-                    u = self.Qsa[(s, a)] + self.args.cpuct * self.Ps[s][a] * math.sqrt(self.Ns[s]) / (
-                            1 + self.Nsa[(s, a)])
-                else:
-                    u = self.args.cpuct * self.Ps[s][a] * math.sqrt(self.Ns[s] + EPS)  # Q = 0 ?
+        self.Ns[node] += 1
+        return -v
 
-                if u > cur_best:
-                    cur_best = u
-                    best_act = a
+    def getChild(self, node, canonicalBoard, a):
+        """
+        Returns:
+            next_s: the canonical board reached by playing a on canonicalBoard
+            child: the node id of next_s
+        """
+        child = self.children[node, a]
+        if child >= 0 or not self.hashKeys:
+            next_s, next_player = self.game.getNextState(canonicalBoard, 1, a)
+            next_s = self.game.getCanonicalForm(next_s, next_player)
+            if child < 0:
+                child = self.getNode(next_s)
+        else:
+            next_s, next_player, key = self.game.getNextStateWithKey(canonicalBoard, 1, a, self.keys[node])
+            key = self.game.getCanonicalHashKey(next_s, key, next_player)
+            next_s = self.game.getCanonicalForm(next_s, next_player)
+            child = self.getNode(next_s, key)
+        self.children[node, a] = child
+        return next_s, child
 
-        a = best_act
-        next_s, next_player = self.game.getNextState(canonicalBoard, 1, a)
-        next_s = self.game.getCanonicalForm(next_s, next_player)
+    def searchBatch(self, canonicalBoard, root, count):
+        """
+        Descends count paths from canonicalBoard, evaluates the leaves they
+        reach with one call to nnet.predict_batch (see utils.predictBoards) and
+        backs up the values.
+
+        Returns:
+            sims: number of completed simulations. Paths that end in a leaf
+                  already reached by another path of the batch are dropped,
+                  so this can be less than count.
+        """
+        leaves, sims = self.gatherLeaves(canonicalBoard, root, count)
+        if leaves:
+            pis, vs = predictBoards(self.nnet, [board for _, _, board in leaves])
+            self.backupLeaves(leaves, pis, vs)
+        return sims + len(leaves)
+
+    def gatherLeaves(self, canonicalBoard, root, count):
+        """
+        Descends count paths from canonicalBoard. Every edge on a path gets a
+        virtual loss so that the following paths of the batch spread over the
+        tree. Paths ending in a terminal state are backed up right away.
 
-        v = self.search(next_s)
+        Returns:
+            leaves: a list of (path, node, board) for the unexpanded leaves
+                    that need a network evaluation, where path is the list of
+                    (node, action) edges from the root. Pass them with the
+                    network output to backupLeaves.
+            sims: number of paths that ended in a terminal state
+        """
+        self.reserveNodes(count, root)
+        leaves = []
+        pending = set()
+        sims = 0
+        for _ in range(count):
+            self.simulations += 1
+            board, node, path = canonicalBoard, root, []
+            while True:
+                self.lastVisit[node] = self.simulations
+                if self.Es[node] != 0:
+                    # terminal node
+                    self.backup(path, -self.Es[node])
+                    sims += 1
+                    break
+
+                if not self.expanded[node]:
+                    # leaf node
+                    if node in pending:
+                        self.revertVirtualLoss(path)
+                    else:
+                        pending.add(node)
+                        leaves.append((path, node, board))
+                    break
 
-        if (s, a) in self.Qsa:
-            self.Qsa[(s, a)] = (self.Nsa[(s, a)] * self.Qsa[(s, a)] + v) / (self.Nsa[(s, a)] + 1)
-            self.Nsa[(s, a)] += 1
+                a = self.selectActionVectorized(node)
+                self.VLsa[node, a] += 1
+                self.VLs[node] += 1
+                path.append((node, a))
 
+                board, node = self.getChild(node, board, a)
+
+        return leaves, sims
+
+    def backupLeaves(self, leaves, pis, vs):
+        """
+        Expands the leaves returned by gatherLeaves with the policies pis and
+        values vs predicted for their boards and backs up the values.
+        """
+        for (path, node, board), pi, v in zip(leaves, pis, vs):
+            self.expand(node, board, pi)
+            self.backup(path, -float(v))
+
+    def backup(self, path, v):
+        """
+        Propagates v, the negative value of the board at the end of path, up
+        the (node, action) edges of path and removes their virtual loss.
+        """
+        for node, a in reversed(path):
+            n = self.Nsa[node, a]
+            self.Qsa[node, a] = (n * self.Qsa[node, a] + v) / (n + 1)
+            self.Nsa[node, a] = n + 1
+            self.Ns[node] += 1
+            v = -v
+        self.revertVirtualLoss(path)
+
+    def revertVirtualLoss(self, path):
+        for node, a in path:
+            self.VLsa[node, a] -= 1
+            self.VLs[node] -= 1
+
+    def expand(self, node, canonicalBoard, pi):
+        """
+        Stores the policy pi returned by the neural network for a leaf node,
+        masked with the valid moves of canonicalBoard.
+        """
+        valids = self.game.getValidMoves(canonicalBoard, 1)
+        ps = pi * valids  # masking invalid moves
+        sum_Ps_s = np.sum(ps)
+        if sum_Ps_s > 0:
+            ps /= sum_Ps_s  # renormalize
         else:
-            self.Qsa[(s, a)] = v
-            self.Nsa[(s, a)] = 1
+            # if all valid moves were masked make all valid moves equally probable
 
-        self.Ns[s] += 1
-        return -v
+            # NB! All valid moves may be masked if either your NNet architecture is insufficient or you've get overfitting or something else.
+            # If you have got dozens or hundreds of these messages you should pay attention to your NNet and/or training process.
+            log.error("All valid moves were masked, doing a workaround.")
+            ps = ps + valids
+            ps /= np.sum(ps)
+
+        self.Ps[node] = ps
+        self.Vs[node] = valids
+        self.Ns[node] = 0
+        self.expanded[node] = True
+
+    def selectAction(self, node):
+        """
+        Returns the action with the highest upper confidence bound from node,
+        looping over the valid actions.
+        """
+        Qs = self.Qsa[node]
+        Ns = self.Nsa[node]
+        Ps = self.Ps[node]
+        cur_best = -float('inf')
+        best_act = -1
+
+        # pick the action with the highest upper confidence bound
+        for a in np.flatnonzero(self.Vs[node]):
+            if Ns[a] > 0:
+                u = Qs[a] + self.args.cpuct * Ps[a] * math.sqrt(self.Ns[node]) / (1 + Ns[a])
+            else:
+                u = self.args.cpuct * Ps[a] * math.sqrt(self.Ns[node] + EPS)  # Q = 0 ?
+
+            if u > cur_best:
+                cur_best = u
+                best_act = a
+
+        return best_act
+
+    def selectActionVectorized(self, node):
+        """
+        Same as selectAction, but computes the upper confidence bounds of all
+        actions at once. The expressions are evaluated in the same order as in
+        the loop, so both give bit-identical scores and np.argmax breaks ties
+        towards the lowest action like the strict comparison does.
+
+        Edges with pending paths of a batch (see gatherLeaves) count each of
+        these paths as args.virtualLoss lost visits.
+        """
+        Qs = self.Qsa[node]
+        Ns = self.Nsa[node]
+        Ps = self.Ps[node]
+        visits = self.Ns[node]
+        if self.VLs[node] > 0:
+            virtualLoss = getattr(self.args, 'virtualLoss', 1) * self.VLsa[node]
+            Qs = np.where(virtualLoss > 0, (Ns * Qs - virtualLoss) / np.maximum(Ns + virtualLoss, 1), Qs)
+            Ns = Ns + virtualLoss
+            visits = visits + getattr(self.args, 'virtualLoss', 1) * self.VLs[node]
+        u = np.where(Ns > 0,
+                     Qs + self.args.cpuct * Ps * math.sqrt(visits) / (1 + Ns),
+                     self.args.cpuct * Ps * math.sqrt(visits + EPS))
+        u = np.where(self.Vs[node], u, -np.inf)
+        return int(np.argmax(u))
@@ -1,3 +1,6 @@
+import numpy as np
+
+
 class NeuralNet():
     """
     This class specifies the base NeuralNet class. To define your own neural
@@ -11,7 +14,7 @@ class NeuralNet():
     def __init__(self, game):
         pass
 
-    def train(self, examples):
+    def train(self, examples, augment=False):
         """
         This function trains the neural network with examples obtained from
         self-play.
@@ -21,6 +24,10 @@ class NeuralNet():
                       (board, pi, v). pi is the MCTS informed policy vector for
                       the given board, and v is its value. The examples has
                       board in its canonical form.
+            augment: if True, the examples hold every position once instead
+                     of all its symmetrical forms, and the network trains on
+                     a random symmetrical form of every example (see
+                     utils.randomSymmetries) each time it is sampled.
         """
         pass
 
@@ -36,6 +43,24 @@ class NeuralNet():
         """
         pass
 
+    def predict_batch(self, boards):
+        """
+        Input:
+            boards: a numpy array of boards in their canonical form, stacked
+                    along the first axis.
+
+        Returns:
+            pis: a numpy array of shape (len(boards), game.getActionSize) with
+                 the policy vector of every board
+            vs: a numpy array of shape (len(boards),) with the value of every
+                board
+
+        The default implementation calls predict on every board; override it
+        to evaluate the whole batch in one forward pass.
+        """
+        pis, vs = zip(*[self.predict(board) for board in boards])
+        return np.array(pis), np.reshape(vs, -1)
+
     def save_checkpoint(self, folder, filename):
         """
         Saves the current neural network (with its parameters) in
@@ -3,6 +3,7 @@ import numpy as np
 
 sys.path.append('..')
 from Game import Game
+from utils import symmetricCanonicalForm
 from .Connect4Logic import Board
 
 
@@ -59,6 +60,9 @@ class Connect4Game(Game):
         """Board is left/right board symmetric"""
         return [(board, pi), (board[:, ::-1], pi[::-1])]
 
+    def getSymmetricCanonicalForm(self, board):
+        return symmetricCanonicalForm(self, board)
+
     def stringRepresentation(self, board):
         return board.tostring()
 
@@ -1,4 +1,5 @@
 from collections import namedtuple
+from functools import lru_cache
 import numpy as np
 
 DEFAULT_HEIGHT = 6
@@ -8,9 +9,25 @@ DEFAULT_WIN_LENGTH = 4
 WinState = namedtuple('WinState', 'is_ended winner')
 
 
+@lru_cache(maxsize=None)
+def _bitboard_layout(height, width):
+    """Returns the bit of every square in row-major order, and the bit values
+    as int64 weights if the board fits in 63 bits (e.g. the standard 6x7)."""
+    bits = np.array([[column * (height + 1) + height - 1 - row for column in range(width)]
+                     for row in range(height)]).ravel()
+    weights = (np.int64(1) << bits) if width * (height + 1) <= 63 else None
+    return bits, weights
+
+
 class Board():
     """
     Connect4 Board.
+
+    Wins are checked on bitboards: each column takes height + 1 bits, from
+    the bottom row up plus an empty sentinel bit, so shifting a bitboard by
+    1, height, height + 1 or height + 2 moves every stone one step along a
+    column, a diagonal, a row or an anti-diagonal without wrapping. The
+    standard 6x7 board fits in 49 bits.
     """
 
     def __init__(self, height=None, width=None, win_length=None, np_pieces=None):
@@ -20,10 +37,12 @@ class Board():
         self.win_length = win_length or DEFAULT_WIN_LENGTH
 
         if np_pieces is None:
-            self.np_pieces = np.zeros([self.height, self.width], dtype=np.int)
+            self.np_pieces = np.zeros([self.height, self.width], dtype=np.int8)
         else:
             self.np_pieces = np_pieces
             assert self.np_pieces.shape == (self.height, self.width)
+        self._shifts = [1, self.height, self.height + 1, self.height + 2]
+        self._bits, self._bit_weights = _bitboard_layout(self.height, self.width)
 
     def add_stone(self, column, player):
         "Create copy of board containing new stone."
@@ -38,13 +57,9 @@ class Board():
         return self.np_pieces[0] == 0
 
     def get_win_state(self):
-        for player in [-1, 1]:
-            player_pieces = self.np_pieces == -player
-            # Check rows & columns for win
-            if (self._is_straight_winner(player_pieces) or
-                self._is_straight_winner(player_pieces.transpose()) or
-                self._is_diagonal_winner(player_pieces)):
-                return WinState(True, -player)
+        for player in [1, -1]:
+            if self._is_bitboard_winner(self._to_bitboard(player)):
+                return WinState(True, player)
 
         # draw has very little value.
         if not self.get_valid_moves().any():
@@ -59,23 +74,26 @@ class Board():
             np_pieces = self.np_pieces
         return Board(self.height, self.width, self.win_length, np_pieces)
 
-    def _is_diagonal_winner(self, player_pieces):
-        """Checks if player_pieces contains a diagonal win."""
-        win_length = self.win_length
-        for i in range(len(player_pieces) - win_length + 1):
-            for j in range(len(player_pieces[0]) - win_length + 1):
-                if all(player_pieces[i + x][j + x] for x in range(win_length)):
-                    return True
-            for j in range(win_length - 1, len(player_pieces[0])):
-                if all(player_pieces[i + x][j - x] for x in range(win_length)):
-                    return True
+    def _to_bitboard(self, player):
+        """Returns the bitboard of the stones of player."""
+        pieces = self.np_pieces.ravel() == player
+        if self._bit_weights is not None:
+            # pack with a dot product
+            return int(self._bit_weights @ pieces)
+        columns = np.zeros(self.width * (self.height + 1), dtype=bool)
+        columns[self._bits] = pieces
+        return int.from_bytes(np.packbits(columns, bitorder='little').tobytes(), 'little')
+
+    def _is_bitboard_winner(self, bitboard):
+        """Checks if bitboard contains win_length stones in a line."""
+        for shift in self._shifts:
+            # each step keeps the stones starting a line one stone longer
+            line = bitboard
+            for _ in range(self.win_length - 1):
+                line &= line >> shift
+            if line:
+                return True
         return False
 
-    def _is_straight_winner(self, player_pieces):
-        """Checks if player_pieces contains a vertical or horizontal win."""
-        run_lengths = [player_pieces[:, i:i + self.win_length].sum(axis=1)
-                       for i in range(len(player_pieces) - self.win_length + 2)]
-        return max([x.max() for x in run_lengths]) >= self.win_length
-
     def __str__(self):
         return str(self.np_pieces)
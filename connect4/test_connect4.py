@@ -165,3 +165,4 @@ def test_immutable_move():
 
     assert original_board_string == game.stringRepresentation(board)
     assert original_board_string != game.stringRepresentation(new_np_pieces)
+
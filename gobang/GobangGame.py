@@ -2,6 +2,7 @@ from __future__ import print_function
 import sys
 sys.path.append('..')
 from Game import Game
+from utils import SymmetryTables, squareSymmetries, symmetricCanonicalForm
 from .GobangLogic import Board
 import numpy as np
 
@@ -10,11 +11,13 @@ class GobangGame(Game):
     def __init__(self, n=15, nir=5):
         self.n = n
         self.n_in_row = nir
+        # index permutations of the symmetries, gathered by getSymmetries
+        self.symmetries = SymmetryTables((n, n), n*n + 1, lambda board, pi: squareSymmetries(board, pi, (n, n)))
 
     def getInitBoard(self):
         # return initial board (numpy board)
         b = Board(self.n)
-        return np.array(b.pieces)
+        return np.array(b.pieces, dtype=np.int8)
 
     def getBoardSize(self):
         # (a,b) tuple
@@ -53,28 +56,20 @@ class GobangGame(Game):
     def getGameEnded(self, board, player):
         # return 0 if not ended, 1 if player 1 won, -1 if player 1 lost
         # player = 1
-        b = Board(self.n)
-        b.pieces = np.copy(board)
-        n = self.n_in_row
-
-        for w in range(self.n):
-            for h in range(self.n):
-                if (w in range(self.n - n + 1) and board[w][h] != 0 and
-                        len(set(board[i][h] for i in range(w, w + n))) == 1):
-                    return board[w][h]
-                if (h in range(self.n - n + 1) and board[w][h] != 0 and
-                        len(set(board[w][j] for j in range(h, h + n))) == 1):
-                    return board[w][h]
-                if (w in range(self.n - n + 1) and h in range(self.n - n + 1) and board[w][h] != 0 and
-                        len(set(board[w + k][h + k] for k in range(n))) == 1):
-                    return board[w][h]
-                if (w in range(self.n - n + 1) and h in range(n - 1, self.n) and board[w][h] != 0 and
-                        len(set(board[w + l][h - l] for l in range(n))) == 1):
-                    return board[w][h]
-        if b.has_legal_moves():
+        winner = Board.get_winners(np.asarray(board)[np.newaxis], self.n_in_row)[0]
+        if winner != 0:
+            return winner
+        if (board == 0).any():
             return 0
         return 1e-4
 
+    def getGameEndedBatch(self, boards, player):
+        # getGameEnded of every board of a batch, evaluated together
+        boards = np.asarray(boards)
+        winners = Board.get_winners(boards, self.n_in_row)
+        full = ~(boards == 0).any(axis=(1, 2))
+        return np.where(winners != 0, winners, np.where(full, 1e-4, 0))
+
     def getCanonicalForm(self, board, player):
         # return state if player==1, else return -state if player==-1
         return player * board
@@ -83,18 +78,13 @@ class GobangGame(Game):
     def getSymmetries(self, board, pi):
         # mirror, rotational
         assert(len(pi) == self.n**2 + 1)  # 1 for pass
-        pi_board = np.reshape(pi[:-1], (self.n, self.n))
-        l = []
-
-        for i in range(1, 5):
-            for j in [True, False]:
-                newB = np.rot90(board, i)
-                newPi = np.rot90(pi_board, i)
-                if j:
-                    newB = np.fliplr(newB)
-                    newPi = np.fliplr(newPi)
-                l += [(newB, list(newPi.ravel()) + [pi[-1]])]
-        return l
+        return self.symmetries.getSymmetries(board, pi)
+
+    def getSymmetriesBatch(self, boards, pis):
+        return self.symmetries.getSymmetriesBatch(boards, pis)
+
+    def getSymmetricCanonicalForm(self, board):
+        return symmetricCanonicalForm(self, board)
 
     def stringRepresentation(self, board):
         # 8x8 numpy array (canonical board)
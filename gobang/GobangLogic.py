@@ -10,7 +10,14 @@ Board data:
 Squares are stored and manipulated as (x,y) tuples.
 x is the column, y is the row.
 '''
+import numpy as np
+
+
 class Board():
+
+    # directions of the lines, as (x,y) offsets from the first square
+    __directions = [(1,0),(0,1),(1,1),(1,-1)]
+
     def __init__(self, n):
         "Set up initial board configuration."
         self.n = n
@@ -54,3 +61,29 @@ class Board():
         assert self[x][y] == 0
         self[x][y] = color
 
+    @staticmethod
+    def get_line_starts(boards, n_in_row):
+        """Returns a boolean array of the shape of the batch of boards, True
+        on the squares starting a line of n_in_row stones of one color
+        towards (1,0), (0,1), (1,1) or (1,-1)."""
+        _, n, _ = boards.shape
+        pad = n_in_row-1
+        padded = np.zeros((len(boards), n+2*pad, n+2*pad), dtype=boards.dtype)
+        padded[:, pad:pad+n, pad:pad+n] = boards
+        starts = np.zeros(boards.shape, dtype=bool)
+        for dx, dy in Board._Board__directions:
+            line = boards != 0
+            for i in range(1, n_in_row):
+                x, y = pad+i*dx, pad+i*dy
+                line &= padded[:, x:x+n, y:y+n] == boards
+            starts |= line
+        return starts
+
+    @staticmethod
+    def get_winners(boards, n_in_row):
+        """Returns for each board of the batch the color of the first line
+        of n_in_row stones, scanning x then y, or 0 if there is none."""
+        starts = Board.get_line_starts(boards, n_in_row).reshape(len(boards), -1)
+        first = np.argmax(starts, axis=1)
+        winners = boards.reshape(len(boards), -1)[np.arange(len(boards)), first]
+        return np.where(starts.any(axis=1), winners, 0)
@@ -6,6 +6,7 @@ import random
 import numpy as np
 import math
 import sys
+from tqdm import tqdm
 import tensorflow as tf
 sys.path.append('..')
 from utils import *
@@ -27,37 +28,46 @@ args = dotdict({
 
 class NNetWrapper(NeuralNet):
     def __init__(self, game):
+        self.game = game
         self.graph = tf.get_default_graph()
         self.nnet = onnet(game, args)
         self.board_x, self.board_y = game.getBoardSize()
         self.action_size = game.getActionSize()
 
-    def train(self, examples):
+    def train(self, examples, augment=False):
         """
         examples: list of examples, each example is of form (board, pi, v)
+        augment: train on random symmetrical forms of the examples, see NeuralNet.train
         """
-        input_boards, target_pis, target_vs = list(zip(*examples))
-        input_boards = np.asarray(input_boards)
-        target_pis = np.asarray(target_pis)
-        target_vs = np.asarray(target_vs)
-        self.nnet.model.fit(x = input_boards, y = [target_pis, target_vs], batch_size = args.batch_size, epochs = args.epochs)
+        # the examples are packed once, minibatches are built in the background
+        batches = MinibatchSampler(examples, args.batch_size, game=self.game if augment else None)
+
+        for epoch in range(args.epochs):
+            print('EPOCH ::: ' + str(epoch + 1))
+            for boards, pis, vs in tqdm(batches, desc='Training Net'):
+                self.nnet.model.train_on_batch(boards, [pis, vs])
 
     def predict(self, board):
         """
         board: np array with board
         """
+        pis, vs = self.predict_batch(board[np.newaxis])
+        return pis[0], vs[0]
+
+    def predict_batch(self, boards):
+        """
+        boards: np array with boards stacked along the first axis
+        """
         # timing
         # start = time.time()
 
-        # preparing input
-        board = board[np.newaxis, :, :]
         with self.graph.as_default():
             # run
             self.nnet.model._make_predict_function()
-            pi, v = self.nnet.model.predict(board)
+            pi, v = self.nnet.model.predict(np.asarray(boards, dtype=np.float32))
 
         #print('PREDICTION TIME TAKEN : {0:03f}'.format(time.time()-start))
-        return pi[0], v[0]
+        return pi, v[:, 0]
 
     def save_checkpoint(self, folder='checkpoint', filename='checkpoint.pth.tar'):
         filepath = os.path.join(folder, filename)
@@ -22,6 +22,7 @@ args = dotdict({
 
 class NNetWrapper(NeuralNet):
     def __init__(self, game):
+        self.game = game
         self.nnet = onnet(game, args)
         self.board_x, self.board_y = game.getBoardSize()
         self.action_size = game.getActionSize()
@@ -32,23 +33,22 @@ class NNetWrapper(NeuralNet):
             temp_sess.run(tf.global_variables_initializer())
         self.sess.run(tf.variables_initializer(self.nnet.graph.get_collection('variables')))
 
-    def train(self, examples):
+    def train(self, examples, augment=False):
         """
         examples: list of examples, each example is of form (board, pi, v)
+        augment: train on random symmetrical forms of the examples, see NeuralNet.train
         """
 
+        batches = MinibatchSampler(examples, args.batch_size, game=self.game if augment else None)
+
         for epoch in range(args.epochs):
             print('EPOCH ::: ' + str(epoch + 1))
             pi_losses = AverageMeter()
             v_losses = AverageMeter()
-            batch_count = int(len(examples) / args.batch_size)
 
             # self.sess.run(tf.local_variables_initializer())
-            t = tqdm(range(batch_count), desc='Training Net')
-            for _ in t:
-                sample_ids = np.random.randint(len(examples), size=args.batch_size)
-                boards, pis, vs = list(zip(*[examples[i] for i in sample_ids]))
-
+            t = tqdm(batches, desc='Training Net')
+            for boards, pis, vs in t:
                 # predict and compute gradient and do SGD step
                 input_dict = {self.nnet.input_boards: boards, self.nnet.target_pis: pis, self.nnet.target_vs: vs,
                               self.nnet.dropout: args.dropout, self.nnet.isTraining: True}
@@ -64,19 +64,23 @@ class NNetWrapper(NeuralNet):
         """
         board: np array with board
         """
+        pis, vs = self.predict_batch(board[np.newaxis])
+        return pis[0], vs[0]
+
+    def predict_batch(self, boards):
+        """
+        boards: np array with boards stacked along the first axis
+        """
         # timing
         # start = time.time()
 
-        # preparing input
-        board = board[np.newaxis, :, :]
-
         # run
         prob, v = self.sess.run([self.nnet.prob, self.nnet.v],
-                                feed_dict={self.nnet.input_boards: board, self.nnet.dropout: 0,
-                                           self.nnet.isTraining: False})
+                                feed_dict={self.nnet.input_boards: np.asarray(boards, dtype=np.float32),
+                                           self.nnet.dropout: 0, self.nnet.isTraining: False})
 
         # print('PREDICTION TIME TAKEN : {0:03f}'.format(time.time()-start))
-        return prob[0], v[0]
+        return prob, v[:, 0]
 
     def save_checkpoint(self, folder='checkpoint', filename='checkpoint.pth.tar'):
         filepath = os.path.join(folder, filename)
@@ -0,0 +1,40 @@
+"""
+To run tests:
+pytest-3 gobang
+"""
+
+import numpy as np
+
+from .GobangGame import GobangGame
+
+
+def test_game_ended_lines():
+    """Tests every line direction is detected, up to the board edges."""
+    game = GobangGame(n=7, nir=4)
+    for (x, y), (dx, dy) in [((3, 0), (1, 0)), ((0, 3), (0, 1)), ((3, 3), (1, 1)), ((0, 6), (1, -1))]:
+        for color in [1, -1]:
+            board = game.getInitBoard()
+            for i in range(4):
+                board[x + i * dx][y + i * dy] = color
+            assert game.getGameEnded(board, 1) == color
+            board[x + 3 * dx][y + 3 * dy] = -color
+            assert game.getGameEnded(board, 1) == 0
+
+
+def test_game_ended_draw():
+    game = GobangGame(n=4, nir=4)
+    board = np.array([[1, 1, -1, -1],
+                      [-1, -1, 1, 1],
+                      [1, 1, -1, -1],
+                      [-1, -1, 1, 1]])
+    assert game.getGameEnded(board, 1) == 1e-4
+
+
+def test_game_ended_batch():
+    """Tests the batch variant agrees with getGameEnded on random boards."""
+    rng = np.random.RandomState(0)
+    game = GobangGame(n=8, nir=5)
+    boards = rng.choice([-1, 0, 1], size=(200, 8, 8), p=[0.45, 0.1, 0.45])
+    results = game.getGameEndedBatch(boards, 1)
+    assert list(results) == [game.getGameEnded(board, 1) for board in boards]
+    assert set(results) == {0, 1, -1}
@@ -18,12 +18,28 @@ MODEL_FOLDER = './model_s' + str(BOARD_LENGTH) + '_l' + str(LAYER_COUNT) + '/'
 args = dotdict({
   'numIters': 1000,
   'numEps': 100,              # Number of complete self-play games to simulate during a new iteration.
+  'numSelfPlayWorkers': 1,    # Number of processes playing the self-play games in parallel.
+  'numLockstepEpisodes': 1,   # Number of self-play games played in lockstep, sharing their network calls.
+  'seed': None,               # Base seed of the parallel self-play games, None for a random one.
+  'inferenceServer': False,   # Whether the self-play workers share one network process that batches their requests.
+  'inferenceBatchSize': None, # Number of boards after which the inference server stops waiting, None for all workers.
+  'inferenceMaxWait': 0.005,  # Seconds the inference server waits to fill a batch.
   'tempThreshold': 15,        #
   'updateThreshold': 0.6,     # During arena playoff, new neural net will be accepted if threshold or more of games are won.
   'maxlenOfQueue': 200000,    # Number of game examples to train the neural networks.
   'numMCTSSims': 25,          # Number of games moves for MCTS to simulate.
   'arenaCompare': 40,         # Number of games to play during arena play to determine if new net will be accepted.
+  'numArenaWorkers': 1,       # Number of processes playing the arena games in parallel.
   'cpuct': 1,
+  'searchBatchSize': 1,       # Number of MCTS leaves evaluated per network call, more than 1 enables virtual loss.
+  'virtualLoss': 1,           # Number of lost visits a pending leaf evaluation adds to the edges of its path.
+  'reuseTree': False,         # Keep the subtree of the played move and release the rest of the MCTS tree.
+  'maxNodes': None,           # Budget of MCTS nodes per tree (see also maxTreeBytes), None for unbounded.
+  'evictionPolicy': 'lru',    # Nodes evicted over budget: 'lru' least recently visited, 'visits' least visited.
+  'evaluationCacheSize': None, # Number of network evaluations self-play keeps across episodes, None for no cache.
+  'symmetricEvaluationCache': False, # Whether the symmetrical forms of a board share one cached evaluation.
+  'augmentSymmetries': False, # Store every position once and train on random symmetrical forms of it.
+  'sparsePolicies': False,    # Store the policies of the examples as their non-zero entries, for large action spaces.
 
   'checkpoint': MODEL_FOLDER,
   'load_model': False,
@@ -0,0 +1,71 @@
+"""
+Measures the moves per second of the Othello rules, comparing the bitboard
+engine behind OthelloGame with the list based OthelloLogic.Board.
+
+To run:
+python -m othello.OthelloBenchmark
+"""
+import time
+
+import numpy as np
+
+from .OthelloGame import OthelloGame
+from .OthelloLogic import Board
+
+
+class ListBoardOthelloGame(OthelloGame):
+    """OthelloGame on top of OthelloLogic.Board, as before the bitboards."""
+
+    def getNextState(self, board, player, action):
+        if action == self.n*self.n:
+            return (board, -player)
+        b = Board(self.n)
+        b.pieces = np.copy(board)
+        b.execute_move((int(action/self.n), action%self.n), player)
+        return (b.pieces, -player)
+
+    def getValidMoves(self, board, player):
+        valids = [0]*self.getActionSize()
+        b = Board(self.n)
+        b.pieces = np.copy(board)
+        legalMoves = b.get_legal_moves(player)
+        if len(legalMoves)==0:
+            valids[-1]=1
+            return np.array(valids)
+        for x, y in legalMoves:
+            valids[self.n*x+y]=1
+        return np.array(valids)
+
+    def getGameEnded(self, board, player):
+        b = Board(self.n)
+        b.pieces = np.copy(board)
+        if b.has_legal_moves(player):
+            return 0
+        if b.has_legal_moves(-player):
+            return 0
+        if b.countDiff(player) > 0:
+            return 1
+        return -1
+
+
+def movesPerSecond(game, numGames, seed=0):
+    """Plays numGames random games and returns the moves per second, each
+    move calling getGameEnded, getValidMoves and getNextState."""
+    rng = np.random.RandomState(seed)
+    moves = 0
+    start = time.time()
+    for _ in range(numGames):
+        board, player = game.getInitBoard(), 1
+        while game.getGameEnded(board, player) == 0:
+            action = rng.choice(np.flatnonzero(game.getValidMoves(board, player)))
+            board, player = game.getNextState(board, player, action)
+            moves += 1
+    return moves / (time.time() - start)
+
+
+if __name__ == "__main__":
+    for n in [6, 8]:
+        listRate = movesPerSecond(ListBoardOthelloGame(n), 20)
+        bitboardRate = movesPerSecond(OthelloGame(n), 20)
+        print('%dx%d: OthelloLogic.Board %.0f moves/s, BitBoard %.0f moves/s (%.1fx)' %
+              (n, n, listRate, bitboardRate, bitboardRate / listRate))
@@ -0,0 +1,82 @@
+'''
+Bitboard implementation of the Othello rules in OthelloLogic.
+Board data:
+  the stones of each color are the bits of a Python integer,
+  square (x,y) is bit n*x+y, the same index as its action.
+Moves and flips are generated a whole direction at a time by shifting the
+bitboards, with masks clearing the squares that would wrap around an edge.
+For n <= 8 every bitboard fits in 64 bits.
+'''
+import numpy as np
+
+
+class BitBoard():
+
+    # list of all 8 directions on the board, as (x,y) offsets
+    __directions = [(1,1),(1,0),(1,-1),(0,-1),(-1,-1),(-1,0),(-1,1),(0,1)]
+
+    def __init__(self, n):
+        "Set up the shifts and edge masks of every direction."
+
+        self.n = n
+        self.full = (1 << (n*n)) - 1
+        self.shifts = []
+        for dx, dy in self.__directions:
+            # squares whose neighbour in the direction is on the board
+            mask = 0
+            for x in range(max(0, -dx), min(n, n-dx)):
+                for y in range(max(0, -dy), min(n, n-dy)):
+                    mask |= 1 << (n*x+y)
+            self.shifts.append((dx*n+dy, mask))
+
+    def fromArray(self, board, color):
+        """Returns the bitboards (own, opponent) of the given color
+        (1 for white, -1 for black) for a numpy board of OthelloLogic."""
+        pieces = np.ravel(board)
+        return self._pack(pieces == color), self._pack(pieces == -color)
+
+    def _pack(self, bits):
+        return int.from_bytes(np.packbits(bits, bitorder='little').tobytes(), 'little')
+
+    @staticmethod
+    def _shift(bb, shift, mask):
+        bb &= mask
+        return bb << shift if shift > 0 else bb >> -shift
+
+    def get_legal_moves(self, own, opp):
+        """Returns the bitboard of the legal moves of own: the empty squares
+        from which a line of opp stones ends in an own stone."""
+        empty = self.full & ~(own | opp)
+        moves = 0
+        for shift, mask in self.shifts:
+            line = self._shift(own, shift, mask) & opp
+            while line:
+                step = self._shift(line, shift, mask)
+                moves |= step & empty
+                line = step & opp
+        return moves
+
+    def get_flips(self, move, own, opp):
+        """Returns the bitboard of the opp stones flipped by playing own on
+        the square with index move."""
+        flips = 0
+        origin = 1 << int(move)
+        for shift, mask in self.shifts:
+            line = 0
+            step = self._shift(origin, shift, mask)
+            while step & opp:
+                line |= step
+                step = self._shift(step, shift, mask)
+            if step & own:
+                flips |= line
+        return flips
+
+    @staticmethod
+    def squares(bb):
+        "Returns the indices of the set bits of a bitboard."
+        squares = []
+        while bb:
+            low = bb & -bb
+            squares.append(low.bit_length() - 1)
+            bb ^= low
+        return squares
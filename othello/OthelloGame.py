@@ -2,7 +2,8 @@ from __future__ import print_function
 import sys
 sys.path.append('..')
 from Game import Game
-from .OthelloLogic import Board
+from utils import SymmetryTables, ZobristHash, squareSymmetries, symmetricCanonicalForm
+from .OthelloBitboard import BitBoard
 import numpy as np
 
 class OthelloGame(Game):
@@ -18,11 +19,20 @@ class OthelloGame(Game):
 
     def __init__(self, n):
         self.n = n
+        # piece 2*square is a -1 stone, 2*square+1 a +1 stone
+        self.zobrist = ZobristHash(np.arange(2*n*n) ^ 1)
+        self.bitboard = BitBoard(n)
+        # index permutations of the symmetries, gathered by getSymmetries
+        self.symmetries = SymmetryTables((n, n), n*n + 1, lambda board, pi: squareSymmetries(board, pi, (n, n)))
 
     def getInitBoard(self):
         # return initial board (numpy board)
-        b = Board(self.n)
-        return np.array(b.pieces)
+        b = np.zeros((self.n, self.n), dtype=np.int8)
+        b[self.n//2-1][self.n//2] = 1
+        b[self.n//2][self.n//2-1] = 1
+        b[self.n//2-1][self.n//2-1] = -1
+        b[self.n//2][self.n//2] = -1
+        return b
 
     def getBoardSize(self):
         # (a,b) tuple
@@ -37,35 +47,50 @@ class OthelloGame(Game):
         # action must be a valid move
         if action == self.n*self.n:
             return (board, -player)
-        b = Board(self.n)
-        b.pieces = np.copy(board)
-        move = (int(action/self.n), action%self.n)
-        b.execute_move(move, player)
-        return (b.pieces, -player)
+        nextBoard, flips = self._executeMove(board, player, action)
+        return (nextBoard, -player)
+
+    def getNextStateWithKey(self, board, player, action, key):
+        # getNextState, updating the hash key with the placed and flipped stones
+        if action == self.n*self.n:
+            return (board, -player, key)
+        nextBoard, flips = self._executeMove(board, player, action)
+        key = self.zobrist.toggle(key, 2*action + (player > 0))
+        for square in flips:
+            key = self.zobrist.toggle(key, 2*square)
+            key = self.zobrist.toggle(key, 2*square + 1)
+        return (nextBoard, -player, key)
+
+    def _executeMove(self, board, player, action):
+        # returns the board after player's stone on action and the flipped squares
+        own, opp = self.bitboard.fromArray(board, player)
+        flips = BitBoard.squares(self.bitboard.get_flips(action, own, opp))
+        assert len(flips)>0
+        nextBoard = np.copy(board)
+        nextBoard.flat[flips] = player
+        nextBoard.flat[action] = player
+        return nextBoard, flips
 
     def getValidMoves(self, board, player):
         # return a fixed size binary vector
-        valids = [0]*self.getActionSize()
-        b = Board(self.n)
-        b.pieces = np.copy(board)
-        legalMoves =  b.get_legal_moves(player)
-        if len(legalMoves)==0:
+        valids = np.zeros(self.getActionSize(), dtype=int)
+        own, opp = self.bitboard.fromArray(board, player)
+        legalMoves = self.bitboard.get_legal_moves(own, opp)
+        if legalMoves==0:
             valids[-1]=1
-            return np.array(valids)
-        for x, y in legalMoves:
-            valids[self.n*x+y]=1
-        return np.array(valids)
+            return valids
+        valids[BitBoard.squares(legalMoves)]=1
+        return valids
 
     def getGameEnded(self, board, player):
         # return 0 if not ended, 1 if player 1 won, -1 if player 1 lost
         # player = 1
-        b = Board(self.n)
-        b.pieces = np.copy(board)
-        if b.has_legal_moves(player):
+        own, opp = self.bitboard.fromArray(board, player)
+        if self.bitboard.get_legal_moves(own, opp):
             return 0
-        if b.has_legal_moves(-player):
+        if self.bitboard.get_legal_moves(opp, own):
             return 0
-        if b.countDiff(player) > 0:
+        if bin(own).count('1') > bin(opp).count('1'):
             return 1
         return -1
 
@@ -76,30 +101,31 @@ class OthelloGame(Game):
     def getSymmetries(self, board, pi):
         # mirror, rotational
         assert(len(pi) == self.n**2+1)  # 1 for pass
-        pi_board = np.reshape(pi[:-1], (self.n, self.n))
-        l = []
-
-        for i in range(1, 5):
-            for j in [True, False]:
-                newB = np.rot90(board, i)
-                newPi = np.rot90(pi_board, i)
-                if j:
-                    newB = np.fliplr(newB)
-                    newPi = np.fliplr(newPi)
-                l += [(newB, list(newPi.ravel()) + [pi[-1]])]
-        return l
+        return self.symmetries.getSymmetries(board, pi)
+
+    def getSymmetriesBatch(self, boards, pis):
+        return self.symmetries.getSymmetriesBatch(boards, pis)
+
+    def getSymmetricCanonicalForm(self, board):
+        return symmetricCanonicalForm(self, board)
 
     def stringRepresentation(self, board):
         return board.tostring()
 
+    def getHashKey(self, board):
+        squares = np.flatnonzero(board)
+        return self.zobrist.getKey(2*squares + (board.flat[squares] > 0))
+
+    def getCanonicalHashKey(self, board, key, player):
+        return key if player == 1 else ZobristHash.swap(key)
+
     def stringRepresentationReadable(self, board):
         board_s = "".join(self.square_content[square] for row in board for square in row)
         return board_s
 
     def getScore(self, board, player):
-        b = Board(self.n)
-        b.pieces = np.copy(board)
-        return b.countDiff(player)
+        own, opp = self.bitboard.fromArray(board, player)
+        return bin(own).count('1') - bin(opp).count('1')
 
     @staticmethod
     def display(board):
@@ -30,16 +30,29 @@ args = dotdict({
 
 def converter(batch, device=None):
     """Convert arrays to float32"""
+    boards, pis, vs = zip(*batch)
+    # densifies SparsePolicy policies
+    batch = list(zip(boards, stackPolicies(pis), vs))
     batch_list = concat_examples(batch, device=device)
     xp = cuda.get_array_module(batch_list[0])
     batch = tuple([xp.asarray(elem, dtype=xp.float32) for elem in batch_list])
     return batch
 
 
+def symmetric_converter(game):
+    """Converter replacing the examples of a batch by random symmetrical forms"""
+    def convert(batch, device=None):
+        boards, pis, vs = zip(*batch)
+        boards, pis = randomSymmetries(game, np.array(boards), stackPolicies(pis))
+        return converter(list(zip(boards, pis, vs)), device=device)
+    return convert
+
+
 class NNetWrapper(NeuralNet):
 
     def __init__(self, game):
         super(NNetWrapper, self).__init__(game)
+        self.game = game
         self.nnet = onnet(game, args)
         self.board_x, self.board_y = game.getBoardSize()
         self.action_size = game.getActionSize()
@@ -49,16 +62,16 @@ class NNetWrapper(NeuralNet):
             chainer.cuda.get_device_from_id(device).use()  # Make a specified GPU current
             self.nnet.to_gpu()
 
-    def train(self, examples):
+    def train(self, examples, augment=False):
         if args.train_mode == 'trainer':
-            self._train_trainer(examples)
+            self._train_trainer(examples, augment)
         elif args.train_mode == 'custom_loop':
-            self._train_custom_loop(examples)
+            self._train_custom_loop(examples, augment)
         else:
             raise ValueError("[ERROR] Unexpected value args.train_mode={}"
                              .format(args.train_mode))
 
-    def _train_trainer(self, examples):
+    def _train_trainer(self, examples, augment=False):
         """Training with chainer trainer module"""
         train_iter = SerialIterator(examples, args.batch_size)
         optimizer = optimizers.Adam(alpha=args.lr)
@@ -77,7 +90,8 @@ class NNetWrapper(NeuralNet):
             return total_loss
 
         updater = training.StandardUpdater(
-            train_iter, optimizer, device=args.device, loss_func=loss_func, converter=converter)
+            train_iter, optimizer, device=args.device, loss_func=loss_func,
+            converter=symmetric_converter(self.game) if augment else converter)
         # Set up the trainer.
         trainer = training.Trainer(updater, (args.epochs, 'epoch'), out=args.out)
         # trainer.extend(extensions.snapshot(), trigger=(args.epochs, 'epoch'))
@@ -87,9 +101,10 @@ class NNetWrapper(NeuralNet):
         trainer.extend(extensions.ProgressBar(update_interval=10))
         trainer.run()
 
-    def _train_custom_loop(self, examples):
+    def _train_custom_loop(self, examples, augment=False):
         """
         examples: list of examples, each example is of form (board, pi, v)
+        augment: train on random symmetrical forms of the examples, see NeuralNet.train
         """
         optimizer = optimizers.Adam(alpha=args.lr)
         optimizer.setup(self.nnet)
@@ -105,6 +120,9 @@ class NNetWrapper(NeuralNet):
             for _ in t:
                 sample_ids = np.random.randint(len(examples), size=args.batch_size)
                 boards, pis, vs = list(zip(*[examples[i] for i in sample_ids]))
+                pis = stackPolicies(pis)
+                if augment:
+                    boards, pis = randomSymmetries(self.game, np.array(boards), pis)
                 xp = self.nnet.xp
                 boards = xp.array(boards, dtype=xp.float32)
                 target_pis = xp.array(pis, dtype=xp.float32)
@@ -132,16 +150,23 @@ class NNetWrapper(NeuralNet):
         """
         board: np array with board
         """
+        pis, vs = self.predict_batch(board[np.newaxis])
+        return pis[0], vs[0]
+
+    def predict_batch(self, boards):
+        """
+        boards: np array with boards stacked along the first axis
+        """
         # timing
         start = time.time()
 
         # preparing input
         xp = self.nnet.xp
-        board = xp.array(board, dtype=xp.float32)
+        boards = xp.array(boards, dtype=xp.float32)
         with chainer.using_config('train', False), chainer.no_backprop_mode():
-            board = xp.reshape(board, (1, self.board_x, self.board_y))
-            pi, v = self.nnet(board)
-        return np.exp(cuda.to_cpu(pi.array)[0]), cuda.to_cpu(v.array)[0]
+            boards = xp.reshape(boards, (-1, self.board_x, self.board_y))
+            pi, v = self.nnet(boards)
+        return np.exp(cuda.to_cpu(pi.array)), cuda.to_cpu(v.array)[:, 0]
 
     def loss_pi(self, targets, outputs):
         return -F.sum(targets * outputs) / targets.shape[0]
@@ -0,0 +1,67 @@
+"""
+To run tests:
+pytest-3 othello
+"""
+
+import numpy as np
+
+from .OthelloGame import OthelloGame
+from .OthelloLogic import Board
+
+
+def reference_valid_moves(game, board, player):
+    """Returns getValidMoves computed with the list based OthelloLogic.Board."""
+    b = Board(game.n)
+    b.pieces = np.copy(board)
+    valids = np.zeros(game.getActionSize(), dtype=int)
+    for x, y in b.get_legal_moves(player):
+        valids[game.n * x + y] = 1
+    if not valids.any():
+        valids[-1] = 1
+    return valids
+
+
+def reference_next_board(game, board, player, action):
+    """Returns the board of getNextState computed with OthelloLogic.Board."""
+    if action == game.n * game.n:
+        return board
+    b = Board(game.n)
+    b.pieces = np.copy(board)
+    b.execute_move((action // game.n, action % game.n), player)
+    return b.pieces
+
+
+def reference_game_ended(game, board, player):
+    """Returns getGameEnded computed with OthelloLogic.Board."""
+    b = Board(game.n)
+    b.pieces = np.copy(board)
+    if b.has_legal_moves(player) or b.has_legal_moves(-player):
+        return 0
+    return 1 if b.countDiff(player) > 0 else -1
+
+
+def test_init_board():
+    game = OthelloGame(8)
+    assert np.array_equal(game.getInitBoard(), np.array(Board(8).pieces))
+
+
+def test_random_games_match_reference():
+    """Tests the bitboard rules agree with OthelloLogic.Board over random games."""
+    rng = np.random.RandomState(0)
+    for n in [4, 6, 8]:
+        game = OthelloGame(n)
+        for _ in range(5):
+            board, player = game.getInitBoard(), 1
+            while True:
+                ended = game.getGameEnded(board, player)
+                assert ended == reference_game_ended(game, board, player)
+                if ended != 0:
+                    assert (ended > 0) == (game.getScore(board, player) > 0)
+                    break
+                valids = game.getValidMoves(board, player)
+                assert np.array_equal(valids, reference_valid_moves(game, board, player))
+                action = rng.choice(np.flatnonzero(valids))
+                next_board, next_player = game.getNextState(board, player, action)
+                assert np.array_equal(next_board, reference_next_board(game, board, player, action))
+                assert next_board.dtype == board.dtype and next_player == -player
+                board, player = next_board, next_player
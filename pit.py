@@ -6,6 +6,7 @@ import numpy as np
 from utils import *
 
 HUMAN_PLAY = True
+NUM_WORKERS = 1  # processes playing the games in parallel when not playing as a human
 BOARD_LENGTH = 5
 LAYER_COUNT = 2
 MODEL_FOLDER = './model_s' + str(BOARD_LENGTH) + '_l' + str(LAYER_COUNT) + '/'
@@ -45,19 +46,37 @@ class HumanPlayer():
       print('Invalid move')
     return action
 
-game = SnowmanGame(BOARD_LENGTH, LAYER_COUNT)
+class RandomVersusMCTSPlayers():
+  """
+  Picklable player factory for Arena, every worker process builds a random
+  player and an MCTS player with the network loaded from the checkpoint.
+  """
 
-if HUMAN_PLAY:
-  player1 = HumanPlayer(game).play
-else:
-  player1 = RandomPlayer(game).play
+  def __init__(self, game):
+    self.game = game
+
+  def __call__(self):
+    nnet = NNet(self.game)
+    nnet.load_checkpoint(MODEL_FOLDER, 'best.pth.tar')
+    args = dotdict({'numMCTSSims': 50, 'cpuct':1.0})
+    mcts = MCTS(self.game, nnet, args)
+    return RandomPlayer(self.game).play, (lambda x: np.argmax(mcts.getActionProb(x, temp=0)))
+
+def main():
+  game = SnowmanGame(BOARD_LENGTH, LAYER_COUNT)
+  playerFactory = RandomVersusMCTSPlayers(game)
+  player1, player2 = playerFactory()
+
+  if HUMAN_PLAY:
+    player1 = HumanPlayer(game).play
 
-nnet = NNet(game)
-nnet.load_checkpoint(MODEL_FOLDER, 'best.pth.tar')
-args = dotdict({'numMCTSSims': 50, 'cpuct':1.0})
-mcts = MCTS(game, nnet, args)
-player2 = (lambda x: np.argmax(mcts.getActionProb(x, temp=0)))
+  arena = Arena.Arena(player1, player2, game, display=SnowmanGame.display,
+                      playerFactory=None if HUMAN_PLAY else playerFactory)
 
-arena = Arena.Arena(player1, player2, game, display=SnowmanGame.display)
+  if HUMAN_PLAY or NUM_WORKERS <= 1:
+    print(arena.playGames(2, verbose=True))
+  else:
+    print(arena.playGames(2, numWorkers=NUM_WORKERS))
 
-print(arena.playGames(2, verbose=True))
+if __name__ == "__main__":
+  main()
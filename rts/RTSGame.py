@@ -8,6 +8,7 @@ from rts.src.config_class import CONFIG
 sys.path.append('..')
 from rts.src.Board import Board
 from rts.src.config import NUM_ENCODERS, NUM_ACTS, P_NAME_IDX, A_TYPE_IDX, TIME_IDX, FPS
+from utils import SymmetryTables, squareSymmetries
 
 """ USE_TIMEOUT, MAX_TIME, d_a_type, a_max_health, INITIAL_GOLD, TIMEOUT, visibility"""
 
@@ -24,6 +25,9 @@ class RTSGame:
 
     def __init__(self) -> None:
         self.n = CONFIG.grid_size
+        # index permutations of the symmetries, gathered by getSymmetries
+        self.symmetries = SymmetryTables(self.getBoardSize(), self.getActionSize(),
+                                         lambda board, pi: squareSymmetries(board, pi, (self.n, self.n, NUM_ACTS)))
 
         self.initial_board_config = CONFIG.initial_board_config
 
@@ -178,17 +182,10 @@ class RTSGame:
     def getSymmetries(self, board: np.ndarray, pi):
         # mirror, rotational
         assert (len(pi) == self.n * self.n * NUM_ACTS + 1)  # 1 for pass
-        pi_board = np.reshape(pi[:-1], (self.n, self.n, NUM_ACTS))
-        return_list = []
-        for i in range(1, 5):
-            for j in [True, False]:
-                newB = np.rot90(board, i)
-                newPi = np.rot90(pi_board, i)
-                if j:
-                    newB = np.fliplr(newB)
-                    newPi = np.fliplr(newPi)
-                return_list += [(newB, list(newPi.ravel()) + [pi[-1]])]
-        return return_list
+        return self.symmetries.getSymmetries(board, pi)
+
+    def getSymmetriesBatch(self, boards: np.ndarray, pis: np.ndarray):
+        return self.symmetries.getSymmetriesBatch(boards, pis)
 
     def stringRepresentation(self, board: np.ndarray):
         return board.tostring()
@@ -6,7 +6,7 @@ import numpy as np
 sys.path.append('../..')
 from NeuralNet import NeuralNet
 from rts.keras.RTSNNet import RTSNNet
-from rts.src.config import VERBOSE_MODEL_FIT
+from utils import MinibatchSampler
 
 """
 NNet.py
@@ -35,25 +35,24 @@ class NNetWrapper(NeuralNet):
         self.action_size = game.getActionSize()
 
         self.encoder = encoder
+        self.game = game
 
-    def train(self, examples):
+    def train(self, examples, augment=False):
         """
         Encodes examples using one of 2 encoders and starts fitting.
         :param examples: list of examples, each example is of form (board, pi, v)
+        :param augment: train on random symmetrical forms of the examples, see NeuralNet.train
         """
         from rts.src.config_class import CONFIG
 
-        input_boards, target_pis, target_vs = list(zip(*examples))
-        input_boards = np.asarray(input_boards)
-        target_pis = np.asarray(target_pis)
-        target_vs = np.asarray(target_vs)
+        # the examples are packed once, minibatches are encoded in the background
+        batches = MinibatchSampler(examples, CONFIG.nnet_args.batch_size,
+                                   transform=lambda boards, pis, vs: (self.encoder.encode_multiple(boards), pis, vs),
+                                   game=self.game if augment else None)
 
-        """
-        input_boards = CONFIG.nnet_args.encoder.encode_multiple(input_boards)
-        """
-        input_boards = self.encoder.encode_multiple(input_boards)
-
-        self.nnet.model.fit(x=input_boards, y=[target_pis, target_vs], batch_size=CONFIG.nnet_args.batch_size, epochs=CONFIG.nnet_args.epochs, verbose=VERBOSE_MODEL_FIT)
+        for epoch in range(CONFIG.nnet_args.epochs):
+            for boards, pis, vs in batches:
+                self.nnet.model.train_on_batch(boards, [pis, vs])
 
     def predict(self, board, player=None):
         """
@@ -63,14 +62,21 @@ class NNetWrapper(NeuralNet):
         :param player: specific player
         :return: vector of predicted actions and win prediction (Pi, V)
         """
-        board = self.encoder.encode(board)
+        pis, vs = self.predict_batch(board[np.newaxis])
+        return pis[0], vs[0]
 
-        # preparing input
-        board = board[np.newaxis, :, :]
+    def predict_batch(self, boards):
+        """
+        Predicts actions for multiple boards in one call.
+        It encodes boards with encoder, that has been used for learning.
+        :param boards: array of boards
+        :return: predicted action vectors and win predictions (Pis, Vs)
+        """
+        boards = self.encoder.encode_multiple(boards)
 
         # run
-        pi, v = self.nnet.model.predict(board)
-        return pi[0], v[0]
+        pi, v = self.nnet.model.predict(boards)
+        return pi, v[:, 0]
 
     def save_checkpoint(self, folder='checkpoint', filename='checkpoint.pth.tar'):
         filepath = os.path.join(folder, filename)
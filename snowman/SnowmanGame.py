@@ -1,4 +1,5 @@
 from Game import Game
+from utils import SymmetryTables, ZobristHash, symmetricCanonicalForm
 import numpy as np
 
 BOARD_LENGTH_MIN = 3
@@ -24,9 +25,25 @@ class SnowmanGame(Game):
     self.boardShape = (planeCount, boardLength, boardLength)
     self.actionSize = boardLength * boardLength * MOVEMENT_COUNT
     self.actionShape = (boardLength, boardLength, MOVEMENT_COUNT)
+    # pieces are the flat board indices, the canonical form swaps the players' planes
+    planePartners = list(range(layerCount, 2 * layerCount)) + list(range(layerCount)) + [planeCount - 1]
+    self.zobrist = ZobristHash(np.repeat(planePartners, boardLength * boardLength) * boardLength * boardLength +
+                               np.tile(np.arange(boardLength * boardLength), planeCount))
+    # valid moves are looked up by the codes of the source and target squares of every direction
+    self.codeWeights = 1 << np.arange(layerCount + 1)
+    self.codePlanes = {1: list(range(layerCount)) + [SNOW_PLANE],
+                       -1: list(range(layerCount, 2 * layerCount)) + [SNOW_PLANE]}
+    self.moveTable = self.getMoveTable()
+    self.moveSlices = []
+    for dx, dy in MOVEMENTS:
+      sourceSlice = (slice(max(-dy, 0), boardLength - max(dy, 0)), slice(max(-dx, 0), boardLength - max(dx, 0)))
+      targetSlice = (slice(max(dy, 0), boardLength - max(-dy, 0)), slice(max(dx, 0), boardLength - max(-dx, 0)))
+      self.moveSlices.append((sourceSlice, targetSlice))
+    # index permutations of the symmetries, gathered by getSymmetries
+    self.symmetries = SymmetryTables(self.boardShape, self.actionSize, self.getSymmetryTransforms)
 
   def getInitBoard(self):
-    board = np.zeros(self.boardShape, dtype=int)
+    board = np.zeros(self.boardShape, dtype=np.int8)
     board[SNOW_PLANE] = 1 # all covered in snow
     return board
 
@@ -41,50 +58,41 @@ class SnowmanGame(Game):
     self.executeAction(nextBoard, player, action)
     return (nextBoard, -player)
 
+  def getNextStateWithKey(self, board, player, action, key):
+    nextBoard = np.copy(board)
+    for piece in self.executeAction(nextBoard, player, action):
+      key = self.zobrist.toggle(key, piece)
+    return (nextBoard, -player, key)
+
   def getValidMoves(self, board, player, moveDetection=False):
-    valids = None
-    if not moveDetection:
-      valids = np.zeros(self.actionSize, dtype=int)
-    firstLayerPlane = (0 if player == 1 else self.layerCount)
-    for y in range(self.boardLength):
-      for x in range(self.boardLength):
-        for i in range(MOVEMENT_COUNT):
-          dx, dy = MOVEMENTS[i]
-          targetX = x + dx
-          targetY = y + dy
-          if (targetX < 0 or targetX >= self.boardLength or
-              targetY < 0 or targetY >= self.boardLength):
-            continue
-          targetWithSnow = (board[SNOW_PLANE][targetY][targetX] != 0)
-          if board[SNOW_PLANE][y][x] != 0:
-            if not targetWithSnow:
-              continue
-          else:
-            sourceLayerIndex = None
-            for j in range(self.layerCount - 1):
-              if board[firstLayerPlane + j][y][x] != 0:
-                if sourceLayerIndex is not None:
-                  sourceLayerIndex = None
-                  break
-                sourceLayerIndex = j
-            if sourceLayerIndex is None:
-              continue
-            if not targetWithSnow:
-              if board[firstLayerPlane + sourceLayerIndex][targetY][targetX] != 0:
-                continue
-              targetWithSnowballs = True
-              for j in range(self.layerCount - 1, sourceLayerIndex, -1):
-                if board[firstLayerPlane + j][targetY][targetX] == 0:
-                  targetWithSnowballs = False
-                  break
-              if not targetWithSnowballs:
-                continue
-          if moveDetection:
-            return True
-          valids[(self.boardLength * y + x) * MOVEMENT_COUNT + i] = 1
+    # moves are looked up by the codes of the source and target squares of every direction
+    squares = self.getSquareCodes(board, player)
     if moveDetection:
-      return False
-    return valids
+      return any(self.moveTable[squares[source], squares[target]].any() for source, target in self.moveSlices)
+    valids = np.zeros(self.actionShape, dtype=int)
+    for i, (source, target) in enumerate(self.moveSlices):
+      valids[source + (i,)] = self.moveTable[squares[source], squares[target]]
+    return valids.ravel()
+
+  def getSquareCodes(self, board, player):
+    # number of every square made of the bits of the player's layers and of the snow
+    codes = np.dot(self.codeWeights, (board[self.codePlanes[player]] != 0).reshape(self.layerCount + 1, -1))
+    return codes.reshape(self.boardLength, self.boardLength)
+
+  def getMoveTable(self):
+    # valid moves from a square to its neighbour, indexed by the codes of both squares
+    codes = np.arange(2 ** (self.layerCount + 1))
+    planes = (codes >> np.arange(self.layerCount + 1)[:, np.newaxis]) & 1 != 0
+    layers, snow = planes[:-1], planes[-1]
+    # a snowball can be moved if exactly one of the lower layers is on the square
+    movable = ~snow & (np.count_nonzero(layers[:-1], axis=0) == 1)
+    # a layer j snowball can be put on a stack with all the layers above j but not j itself
+    stacked = np.logical_and.accumulate(layers[::-1], axis=0)[::-1]
+    stackable = ~layers[:-1] & stacked[1:]
+    # snowballs of every layer roll over snow, and snow is rolled over snow into a small one
+    sources = np.concatenate([movable & layers[:-1], snow[np.newaxis]])
+    targets = np.concatenate([stackable | snow, snow[np.newaxis]])
+    return (sources[:, :, np.newaxis] & targets[:, np.newaxis, :]).any(axis=0)
 
   def getGameEnded(self, board, player):
     if self.isPlayerWin(board, -player):
@@ -105,6 +113,13 @@ class SnowmanGame(Game):
 
   def getSymmetries(self, board, pi):
     assert len(pi) == self.actionSize
+    return self.symmetries.getSymmetries(board, pi)
+
+  def getSymmetriesBatch(self, boards, pis):
+    return self.symmetries.getSymmetriesBatch(boards, pis)
+
+  def getSymmetryTransforms(self, board, pi):
+    # the symmetries of getSymmetries, only applied to index arrays by SymmetryTables
     shapedPi = np.reshape(pi, self.actionShape)
     symmetries = []
     for rotation in range(4):
@@ -126,10 +141,23 @@ class SnowmanGame(Game):
         symmetries += [(symmetricBoard, symmetricPi)]
     return symmetries
 
+  def getSymmetricCanonicalForm(self, board):
+    return symmetricCanonicalForm(self, board)
+
   def stringRepresentation(self, board):
     return board.tostring()
 
+  def getHashKey(self, board):
+    return self.zobrist.getKey(np.flatnonzero(board))
+
+  def getCanonicalHashKey(self, board, key, player):
+    return key if player == 1 else ZobristHash.swap(key)
+
+  def getPiece(self, plane, y, x):
+    return ((plane % self.boardShape[0]) * self.boardLength + y) * self.boardLength + x
+
   def executeAction(self, board, player, action):
+    # returns the pieces (flat board indices) that were toggled
     assert action >= 0 and action < self.actionSize
     pickAction = int(action / MOVEMENT_COUNT)
     moveDirection = action % MOVEMENT_COUNT
@@ -146,6 +174,8 @@ class SnowmanGame(Game):
       board[SNOW_PLANE][y][x] = 0
       board[SNOW_PLANE][targetY][targetX] = 0
       board[firstLayerPlane][targetY][targetX] = 1
+      return [self.getPiece(SNOW_PLANE, y, x), self.getPiece(SNOW_PLANE, targetY, targetX),
+              self.getPiece(firstLayerPlane, targetY, targetX)]
     else:
       sourceLayerIndex = None
       for i in range(self.layerCount - 1):
@@ -159,22 +189,19 @@ class SnowmanGame(Game):
         board[SNOW_PLANE][targetY][targetX] = 0
         assert board[sourceLayerPlane + 1][targetY][targetX] == 0
         board[sourceLayerPlane + 1][targetY][targetX] = 1
+        return [self.getPiece(sourceLayerPlane, y, x), self.getPiece(SNOW_PLANE, targetY, targetX),
+                self.getPiece(sourceLayerPlane + 1, targetY, targetX)]
       else:
         for i in range(self.layerCount - 1, sourceLayerIndex, -1):
           assert board[firstLayerPlane + i][targetY][targetX] != 0
         assert board[sourceLayerPlane][targetY][targetX] == 0
         board[sourceLayerPlane][targetY][targetX] = 1
+        return [self.getPiece(sourceLayerPlane, y, x), self.getPiece(sourceLayerPlane, targetY, targetX)]
 
   def isPlayerWin(self, board, player):
+    # a snowman is a square with all the layers of the player
     firstLayerPlane = (0 if player == 1 else self.layerCount)
-    for y in range(self.boardLength):
-      for x in range(self.boardLength):
-        for i in range(self.layerCount - 1, -1, -1):
-          if board[firstLayerPlane + i][y][x] == 0:
-            break
-          elif i == 0:
-            return True
-    return False
+    return bool(np.logical_and.reduce(board[firstLayerPlane:firstLayerPlane + self.layerCount] != 0).any())
 
   # Board example of size 6x6 with 2 layers
   # '*' - snow, 'o'/'O' - snowballs, x'/'X' - opponent snowballs
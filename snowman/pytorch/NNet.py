@@ -27,6 +27,7 @@ args = dotdict({
 
 class NNetWrapper(NeuralNet):
   def __init__(self, game):
+    self.game = game
     self.nnet = NNet(game, args)
     self.plane_count, self.board_x, self.board_y = game.getBoardSize()
     self.action_size = game.getActionSize()
@@ -34,32 +35,30 @@ class NNetWrapper(NeuralNet):
     if args.cuda:
       self.nnet.cuda()
 
-  def train(self, examples):
+  def train(self, examples, augment=False):
     """
     examples: list of examples, each example is of form (board, pi, v)
+    augment: train on random symmetrical forms of the examples, see NeuralNet.train
     """
     optimizer = optim.Adam(self.nnet.parameters())
 
+    def toTensors(*arrays):
+      tensors = [torch.from_numpy(array) for array in arrays]
+      if args.cuda:
+        tensors = [tensor.contiguous().cuda() for tensor in tensors]
+      return tensors
+
+    # the examples are packed once, minibatches are turned into tensors in the background
+    batches = MinibatchSampler(examples, args.batch_size, transform=toTensors, game=self.game if augment else None)
+
     for epoch in range(args.epochs):
       print('EPOCH ::: ' + str(epoch + 1))
       self.nnet.train()
       pi_losses = AverageMeter()
       v_losses = AverageMeter()
 
-      batch_count = int(len(examples) / args.batch_size)
-
-      t = tqdm(range(batch_count), desc='Training Net')
-      for _ in t:
-        sample_ids = np.random.randint(len(examples), size=args.batch_size)
-        boards, pis, vs = list(zip(*[examples[i] for i in sample_ids]))
-        boards = torch.FloatTensor(np.array(boards).astype(np.float64))
-        target_pis = torch.FloatTensor(np.array(pis))
-        target_vs = torch.FloatTensor(np.array(vs).astype(np.float64))
-
-        # predict
-        if args.cuda:
-          boards, target_pis, target_vs = boards.contiguous().cuda(), target_pis.contiguous().cuda(), target_vs.contiguous().cuda()
-
+      t = tqdm(batches, desc='Training Net')
+      for boards, target_pis, target_vs in t:
         # compute output
         out_pi, out_v = self.nnet(boards)
         l_pi = self.loss_pi(target_pis, out_pi)
@@ -80,19 +79,26 @@ class NNetWrapper(NeuralNet):
     """
     board: np array with board
     """
+    pis, vs = self.predict_batch(board[np.newaxis])
+    return pis[0], vs[0]
+
+  def predict_batch(self, boards):
+    """
+    boards: np array with boards stacked along the first axis
+    """
     # timing
     start = time.time()
 
     # preparing input
-    board = torch.FloatTensor(board.astype(np.float64))
-    if args.cuda: board = board.contiguous().cuda()
-    board = board.view(self.plane_count, self.board_x, self.board_y)
+    boards = torch.from_numpy(np.asarray(boards, dtype=np.float32))
+    if args.cuda: boards = boards.contiguous().cuda()
+    boards = boards.view(-1, self.plane_count, self.board_x, self.board_y)
     self.nnet.eval()
     with torch.no_grad():
-      pi, v = self.nnet(board)
+      pi, v = self.nnet(boards)
 
     # print('PREDICTION TIME TAKEN : {0:03f}'.format(time.time()-start))
-    return torch.exp(pi).data.cpu().numpy()[0], v.data.cpu().numpy()[0]
+    return torch.exp(pi).data.cpu().numpy(), v.data.cpu().numpy()[:, 0]
 
   def loss_pi(self, targets, outputs):
     return -torch.sum(targets * outputs) / targets.size()[0]
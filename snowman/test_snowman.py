@@ -0,0 +1,118 @@
+"""
+To run tests:
+pytest-3 snowman
+"""
+
+import numpy as np
+
+from .SnowmanGame import SnowmanGame, MOVEMENTS, MOVEMENT_COUNT, SNOW_PLANE
+
+
+def reference_valid_moves(game, board, player):
+  """Returns getValidMoves computed square by square with the original loops."""
+  valids = np.zeros(game.actionSize, dtype=int)
+  firstLayerPlane = (0 if player == 1 else game.layerCount)
+  for y in range(game.boardLength):
+    for x in range(game.boardLength):
+      for i in range(MOVEMENT_COUNT):
+        dx, dy = MOVEMENTS[i]
+        targetX = x + dx
+        targetY = y + dy
+        if (targetX < 0 or targetX >= game.boardLength or
+            targetY < 0 or targetY >= game.boardLength):
+          continue
+        targetWithSnow = (board[SNOW_PLANE][targetY][targetX] != 0)
+        if board[SNOW_PLANE][y][x] != 0:
+          if not targetWithSnow:
+            continue
+        else:
+          sourceLayerIndex = None
+          for j in range(game.layerCount - 1):
+            if board[firstLayerPlane + j][y][x] != 0:
+              if sourceLayerIndex is not None:
+                sourceLayerIndex = None
+                break
+              sourceLayerIndex = j
+          if sourceLayerIndex is None:
+            continue
+          if not targetWithSnow:
+            if board[firstLayerPlane + sourceLayerIndex][targetY][targetX] != 0:
+              continue
+            targetWithSnowballs = True
+            for j in range(game.layerCount - 1, sourceLayerIndex, -1):
+              if board[firstLayerPlane + j][targetY][targetX] == 0:
+                targetWithSnowballs = False
+                break
+            if not targetWithSnowballs:
+              continue
+        valids[(game.boardLength * y + x) * MOVEMENT_COUNT + i] = 1
+  return valids
+
+
+def reference_player_win(game, board, player):
+  """Returns isPlayerWin computed square by square with the original loops."""
+  firstLayerPlane = (0 if player == 1 else game.layerCount)
+  for y in range(game.boardLength):
+    for x in range(game.boardLength):
+      for i in range(game.layerCount - 1, -1, -1):
+        if board[firstLayerPlane + i][y][x] == 0:
+          break
+        elif i == 0:
+          return True
+  return False
+
+
+def test_random_games_match_reference():
+  """Tests the vectorized rules agree with the loops over random games."""
+  rng = np.random.RandomState(0)
+  for boardLength, layerCount in [(3, 2), (4, 3), (6, 3), (5, 4)]:
+    game = SnowmanGame(boardLength, layerCount)
+    for _ in range(10):
+      board, player = game.getInitBoard(), 1
+      while True:
+        for p in [1, -1]:
+          assert np.array_equal(game.getValidMoves(board, p), reference_valid_moves(game, board, p))
+          assert game.isPlayerWin(board, p) == reference_player_win(game, board, p)
+        valids = game.getValidMoves(board, player)
+        assert game.getValidMoves(board, player, True) == valids.any()
+        if game.getGameEnded(board, player) != 0:
+          break
+        board, player = game.getNextState(board, player, rng.choice(np.flatnonzero(valids)))
+
+
+def test_stacking_moves():
+  """Tests a snowball can only be put on a stack with all the layers above it."""
+  game = SnowmanGame(3, 3)
+  board = np.zeros(game.getBoardSize(), dtype=int)
+  board[0, 0, 0] = 1 # small snowball at A1
+  board[2, 0, 1] = 1 # large snowball at A2
+  board[1, 1, 1] = 1 # medium snowball at B2
+  board[0, 2, 0] = board[1, 2, 0] = 1 # small on medium snowball at C1
+  valids = game.getValidMoves(board, 1).reshape(game.actionShape)
+  assert not valids[0, 0, 0] # small on large snowball
+  assert valids[1, 1, 3] # medium on large snowball
+  assert not valids[2, 0].any() # two snowballs can not be moved together
+  board, _ = game.getNextState(board, 1, (3 * 1 + 1) * MOVEMENT_COUNT + 3)
+  assert game.getGameEnded(board, 1) == 0
+  board, _ = game.getNextState(board, 1, (3 * 0 + 0) * MOVEMENT_COUNT + 0)
+  assert game.getGameEnded(board, 1) == 1
+  assert game.getGameEnded(board, -1) == -1
+
+
+def test_incremental_hash_keys():
+  """Tests incrementally updated keys match keys computed from the boards."""
+  rng = np.random.RandomState(0)
+  game = SnowmanGame()
+  maxToggles = 0
+  for _ in range(5):
+    board, player = game.getInitBoard(), 1
+    key = game.getHashKey(board)
+    while game.getGameEnded(board, player) == 0:
+      canonicalBoard = game.getCanonicalForm(board, player)
+      assert game.getCanonicalHashKey(board, key, player) == game.getHashKey(canonicalBoard)
+      action = rng.choice(np.flatnonzero(game.getValidMoves(board, player)))
+      nextBoard, player, key = game.getNextStateWithKey(board, player, action, key)
+      assert key == game.getHashKey(nextBoard)
+      maxToggles = max(maxToggles, np.count_nonzero(nextBoard != board))
+      board = nextBoard
+  assert maxToggles >= 3  # moves clearing the snow toggle three pieces
@@ -37,22 +37,21 @@ class TaflGame(Game):
         # if player takes action on board, return next (board,player)
         # action must be a valid move
         b = board.getCopy()
-        move = int2base(action,self.n,4)
+        # the digits of action in base n, int2base only has digits for n <= 10
+        move = [action // self.n**i % self.n for i in range(4)]
         b.execute_move(move, player)
         return (b, -player)
 
     def getValidMoves(self, board, player):
         # return a fixed size binary vector
         #Note: Ignoreing the passed in player variable since we are not inverting colors for getCanonicalForm and Arena calls with constant 1.
-        valids = [0]*self.getActionSize()
-        b = board.getCopy()
-        legalMoves =  b.get_legal_moves(board.getPlayerToMove())
+        valids = np.zeros(self.getActionSize(), dtype=int)
+        legalMoves = board._getValidMoves(board.getPlayerToMove())
         if len(legalMoves)==0:
             valids[-1]=1
-            return np.array(valids)
-        for x1, y1, x2, y2 in legalMoves:
-            valids[x1+y1*self.n+x2*self.n**2+y2*self.n**3]=1
-        return np.array(valids)
+            return valids
+        valids[legalMoves @ self.n**np.arange(4)]=1
+        return valids
 
     def getGameEnded(self, board, player):
         # return 0 if not ended, if player 1 won, -1 if player 1 lost
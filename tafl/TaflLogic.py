@@ -1,57 +1,76 @@
 import numpy as np
 from .GameVariants import Tafl
 
-class Board():
+# directions a piece moves in, as (x,y) offsets
+DIRECTIONS = [(1,0),(-1,0),(0,1),(0,-1)]
 
+class Board():
+    """
+    Tafl board backed by numpy arrays.
+    board and pieces are integer arrays of [x,y,type] rows. Two grids indexed
+    by [y,x] are kept next to them: the number of the piece on every square
+    (-1 if empty), updated on every move, and the forbidden squares (type > 0
+    in board) that only the king may enter. The image of the board is cached
+    until the next move.
+    """
 
     def __init__(self, gv):
-      self.size=gv.size  
+      self.size=gv.size
       self.width=gv.size
       self.height=gv.size
-      self.board=gv.board #[x,y,type]
-      self.pieces=gv.pieces #[x,y,type]
+      self.board=np.array(gv.board, dtype=int).reshape(-1, 3) #[x,y,type]
+      self.pieces=np.array(gv.pieces, dtype=int).reshape(-1, 3) #[x,y,type]
       self.time=0
       self.done=0
+      self._forbidden = np.zeros((self.height, self.width), dtype=bool)
+      special = self.board[self.board[:,2] > 0]
+      self._forbidden[special[:,1], special[:,0]] = True
+      self._pieceAt = np.full((self.height, self.width), -1, dtype=int)
+      alive = np.flatnonzero(self.pieces[:,0] >= 0)
+      self._pieceAt[self.pieces[alive,1], self.pieces[alive,0]] = alive
+      self._image = None
 
     def __str__(self):
-        return str(self.getPlayerToMove()) + ''.join(str(r) for v in self.getImage() for r in v) 
+        return str(self.getPlayerToMove()) + ''.join(map(str, self.getImage().ravel().tolist()))
 
     # add [][] indexer syntax to the Board
-    def __getitem__(self, index): 
-        return np.array(self.getImage())[index]
+    def __getitem__(self, index):
+        return self.getImage()[index]
 
     def astype(self,t):
-        return np.array(self.getImage()).astype(t)
+        return self.getImage().astype(t)
+
+    # numpy converts the board to a copy of its image, e.g. to stack boards for the network
+    def __array__(self, dtype=None):
+        return np.array(self.getImage(), dtype=dtype)
 
     def getCopy(self):
-      gv=Tafl()
-      gv.size=self.size
-      gv.board=np.copy(np.array(self.board)).tolist()
-      gv.pieces=np.copy(np.array(self.pieces)).tolist()
-      b = Board(gv)
+      b = Board.__new__(Board)
+      b.size=self.size
+      b.width=self.width
+      b.height=self.height
+      b.board=self.board
+      b.pieces=np.copy(self.pieces)
       b.time=self.time
       b.done=self.done
+      b._forbidden=self._forbidden
+      b._pieceAt=np.copy(self._pieceAt)
+      b._image=self._image
       return b
 
 
     def countDiff(self, color):
         """Counts the # pieces of the given color
         (1 for white, -1 for black, 0 for empty spaces)"""
-        count = 0
-        for p in self.pieces:
-            if p[0] >= 0:
-               if p[2]*color > 0:
-                   count += 1
-               else:
-                   count -= 1
-        return count
+        alive = self.pieces[self.pieces[:,0] >= 0]
+        return int(np.sum(np.where(alive[:,2]*color > 0, 1, -1)))
 
     def get_legal_moves(self, color):
         """Returns all the legal moves for the given color.
         (1 for white, -1 for black
         """
-        return self._getValidMoves(color)
-     
+        return self._getValidMoves(color).tolist()
+
     def has_legal_moves(self, color):
         vm = self._getValidMoves(color)
         if len(vm)>0: return True
@@ -64,20 +83,25 @@ class Board():
         """
         x1,y1,x2,y2 = move
         pieceno = self._getPieceNo(x1,y1)
+        if pieceno < 0: return #no piece on the square
         legal = self._isLegalMove(pieceno,x2,y2)
         if legal>=0:
-           #print("Accepted move: ",move) 
+           #print("Accepted move: ",move)
            self._moveByPieceNo(pieceno,x2,y2)
         #else:
            #print("Illegal move:",move,legal)
-   
+
     def getImage(self):
-        image = [[0 for col in range(self.width)] for row in range(self.height)]
-        for item in self.board:
-            image[item[1]][item[0]] = item[2]*10
-        for piece in self.pieces:
-            if piece[0] >= 0: image[piece[1]][piece[0]] = piece[2] + image[piece[1]][piece[0]]
-        return image
+        """Returns the board as a [y][x] array: 10 times the type of the
+        square plus the type of the piece on it. Do not modify it, it is
+        cached until the next move."""
+        if self._image is None:
+            image = np.zeros((self.height, self.width), dtype=np.int8)
+            image[self.board[:,1], self.board[:,0]] = self.board[:,2]*10
+            alive = self.pieces[self.pieces[:,0] >= 0]
+            image[alive[:,1], alive[:,0]] += alive[:,2]
+            self._image = image
+        return self._image
 
     def getPlayerToMove(self):
         return -(self.time%2*2-1)
@@ -86,10 +110,8 @@ class Board():
 ################## Internal methods ##################
 
     def _isLegalMove(self,pieceno,x2,y2):
-      try:
+         if x2 < 0 or y2 < 0 or x2 >= self.width or y2 >= self.height: return -1
 
-         if x2 < 0 or y2 < 0 or x2 >= self.width or y2 > self.height: return -1
-         
          piece = self.pieces[pieceno]
          x1=piece[0]
          y1=piece[1]
@@ -100,86 +122,93 @@ class Board():
          piecetype = piece[2]
          if (piecetype == -1 and self.time%2 == 0) or (piecetype != -1 and self.time%2 == 1): return -5 #wrong player
 
-         for item in self.board:
-            if item[0] == x2 and item[1] == y2 and item[2] > 0:
-                if piecetype != 2: return -10 #forbidden space
-         for apiece in self.pieces:
-            if y1==y2 and y1 == apiece[1] and ((x1 < apiece[0] and x2 >= apiece[0]) or (x1 > apiece[0] and x2 <= apiece[0])): return -20 #interposing piece
-            if x1==x2 and x1 == apiece[0] and ((y1 < apiece[1] and y2 >= apiece[1]) or (y1 > apiece[1] and y2 <= apiece[1])): return -20 #interposing piece
+         if self._forbidden[y2,x2] and piecetype != 2: return -10 #forbidden space
+         if y1 == y2:
+             between = self._pieceAt[y1, min(x1,x2):max(x1,x2)+1]
+         else:
+             between = self._pieceAt[min(y1,y2):max(y1,y2)+1, x1]
+         if np.count_nonzero(between >= 0) > 1: return -20 #interposing piece
 
          return 0 # legal move
-      except Exception as ex:
-         print("error in islegalmove ",ex,pieceno,x2,y2)
-         raise
 
-   
+
     def _getCaptures(self,pieceno,x2,y2):
        #Assumes was already checked for legal move
+       #an opponent piece next to (x2,y2) is captured if a piece of the mover is behind it
        captures=[]
-       piece=self.pieces[pieceno]
-       piecetype = piece[2]
-       for apiece in self.pieces:
-          if piecetype*apiece[2] < 0:
-             d1 = apiece[0]-x2 
-             d2 = apiece[1]-y2
-             if (abs(d1)==1 and d2==0) or (abs(d2)==1 and d1==0): 
-                 for bpiece in self.pieces:
-                    if piecetype*bpiece[2] > 0 and not(piece[0]==bpiece[0] and piece[1]==bpiece[1]):
-                       e1 = bpiece[0]-apiece[0]
-                       e2 = bpiece[1]-apiece[1]
-                       if d1==e1 and d2==e2:
-                          captures.extend([apiece])
+       piecetype = self.pieces[pieceno,2]
+       for dx, dy in DIRECTIONS:
+           ax, ay, bx, by = x2+dx, y2+dy, x2+2*dx, y2+2*dy
+           if 0 <= bx < self.width and 0 <= by < self.height:
+               apiece = self._pieceAt[ay,ax]
+               bpiece = self._pieceAt[by,bx]
+               if apiece >= 0 and bpiece >= 0 and \
+                  piecetype*self.pieces[apiece,2] < 0 and piecetype*self.pieces[bpiece,2] > 0:
+                   captures.append(apiece)
        return captures
 
     # returns code for invalid mode (<0) or number of pieces captured
     def _moveByPieceNo(self,pieceno,x2,y2):
-      
+
       legal = self._isLegalMove(pieceno,x2,y2)
       if legal != 0: return legal
 
       self.time = self.time + 1
 
       piece=self.pieces[pieceno]
+      self._pieceAt[piece[1],piece[0]] = -1
       piece[0]=x2
       piece[1]=y2
+      self._pieceAt[y2,x2] = pieceno
       caps = self._getCaptures(pieceno,x2,y2)
       #print("Captures = ",caps)
       for c in caps:
-          c[0]=-99
+          self._pieceAt[self.pieces[c,1],self.pieces[c,0]] = -1
+          self.pieces[c,0]=-99
+      self._image = None
 
       self.done = self._getWinLose()
-      
+
       return len(caps)
-        
+
 
 
     def _getWinLose(self):
        if self.time > 50: return -1
-       for apiece in self.pieces:
-           if apiece[2]==2 and apiece[0] > -1:
-               for item in self.board:
-                 if item[0]==apiece[0] and item[1]==apiece[1] and item[2]==1:
-                     return 1 #white won
-               return 0 # no winner
-       return -1  #white lost
-   
-    def _getPieceNo(self,x,y):
-       for pieceno in range(len(self.pieces)):
-           piece=self.pieces[pieceno]
-           if piece[0]==x and piece[1]==y: return pieceno
-       return -1    
-   
-    def _getValidMoves(self,player):
-       moves=[]
-       for pieceno in range(len(self.pieces)):
-           piece=self.pieces[pieceno]
-           if piece[2]*player > 0:
-              #print("checking pieceno ",pieceno,piece)
-              for x in range(0,self.width):
-                  if self._isLegalMove(pieceno,x,piece[1])>=0:moves.extend([[piece[0],piece[1],x,piece[1]]])
-              for y in range(0,self.height):
-                  if self._isLegalMove(pieceno,piece[0],y)>=0:moves.extend([[piece[0],piece[1],piece[0],y]])
-       #print("moves ",moves)
-       return moves
+       king = self.pieces[(self.pieces[:,2]==2) & (self.pieces[:,0] > -1)]
+       if len(king) == 0: return -1  #white lost
+       x, y = king[0,0], king[0,1]
+       if ((self.board[:,0]==x) & (self.board[:,1]==y) & (self.board[:,2]==1)).any():
+           return 1 #white won
+       return 0 # no winner
 
+    def _getPieceNo(self,x,y):
+       if 0 <= x < self.width and 0 <= y < self.height:
+           return self._pieceAt[y,x]
+       return -1
 
+    def _getValidMoves(self,player):
+       """Returns the legal moves of player as an array of [x1,y1,x2,y2]
+       rows, casting rays from every piece along its rank and file until
+       the first piece."""
+       if (player < 0) != (self.time%2 == 1):
+           return np.zeros((0, 4), dtype=int) #wrong player
+       mine = self.pieces[(self.pieces[:,0] >= 0) & (self.pieces[:,2]*player > 0)]
+       x1, y1 = mine[:,0:1], mine[:,1:2]
+       king = mine[:,2:3] == 2
+       steps = np.arange(1, self.size)
+       # squares off the board are blocked, padded so that every ray stays in the arrays
+       pad = self.size
+       free = np.zeros((self.height+2*pad, self.width+2*pad), dtype=bool)
+       free[pad:pad+self.height, pad:pad+self.width] = self._pieceAt < 0
+       allowed = np.zeros(free.shape, dtype=bool)
+       allowed[pad:pad+self.height, pad:pad+self.width] = ~self._forbidden
+       moves = []
+       for dx, dy in DIRECTIONS:
+           x2, y2 = x1 + dx*steps, y1 + dy*steps
+           # the ray stops before the first piece or the edge
+           reach = np.logical_and.accumulate(free[y2+pad, x2+pad], axis=1)
+           valid = reach & (king | allowed[y2+pad, x2+pad])
+           rows = np.nonzero(valid)[0]
+           moves.append(np.stack([mine[rows,0], mine[rows,1], x2[valid], y2[valid]], axis=1))
+       return np.concatenate(moves)
@@ -0,0 +1,56 @@
+"""
+To run tests:
+pytest-3 tafl
+"""
+
+import numpy as np
+
+from .TaflGame import TaflGame
+
+
+def test_initial_valid_moves():
+    """Tests the opening moves of Brandubh: each of the 4 defenders next to
+    the king moves along its free file or rank, but not onto the corners."""
+    game = TaflGame("Brandubh")
+    board = game.getInitBoard()
+    expected = ([[2, 3, 2, y] for y in [0, 1, 2, 4, 5, 6]] + [[4, 3, 4, y] for y in [0, 1, 2, 4, 5, 6]] +
+                [[3, 2, x, 2] for x in [0, 1, 2, 4, 5, 6]] + [[3, 4, x, 4] for x in [0, 1, 2, 4, 5, 6]])
+    assert sorted(board.get_legal_moves(board.getPlayerToMove())) == sorted(expected)
+    valids = game.getValidMoves(board, 1)
+    assert sorted(np.flatnonzero(valids)) == sorted(x1 + y1 * 7 + x2 * 49 + y2 * 343 for x1, y1, x2, y2 in expected)
+
+
+def test_random_games_keep_board_consistent():
+    """Tests the piece grid and the cached image follow the pieces over random games."""
+    rng = np.random.RandomState(0)
+    for name in ["Brandubh", "Hnefatafl"]:
+        game = TaflGame(name)
+        board, player = game.getInitBoard(), 1
+        while game.getGameEnded(board, player) == 0:
+            action = rng.choice(np.flatnonzero(game.getValidMoves(board, player)))
+            nextBoard, player = game.getNextState(board, player, action)
+            assert nextBoard.time == board.time + 1
+            board = nextBoard
+            alive = np.flatnonzero(board.pieces[:, 0] >= 0)
+            assert np.count_nonzero(board._pieceAt >= 0) == len(alive)
+            assert (board._pieceAt[board.pieces[alive, 1], board.pieces[alive, 0]] == alive).all()
+            image = np.zeros((board.size, board.size), dtype=int)
+            for x, y, t in board.board:
+                image[y][x] = t * 10
+            for x, y, t in board.pieces[alive]:
+                image[y][x] += t
+            assert (board.getImage() == image).all()
+
+
+def test_boards_pack_into_arrays():
+    """Tests training examples of Tafl boards pack into float32 arrays of their images."""
+    from utils import packExamples
+
+    game = TaflGame("Brandubh")
+    board = game.getInitBoard()
+    nextBoard, _ = game.getNextState(board, 1, np.flatnonzero(game.getValidMoves(board, 1))[0])
+    pi = np.ones(game.getActionSize()) / game.getActionSize()
+    boards, pis, vs = packExamples([(board, pi, 1), (nextBoard, pi, -1)])
+    assert boards.dtype == np.float32 and boards.shape == (2, 7, 7)
+    assert np.array_equal(boards[0], board.getImage()) and np.array_equal(boards[1], nextBoard.getImage())
+    assert np.asarray(board).dtype == np.int8 and np.asarray(board) is not board.getImage()
@@ -0,0 +1,91 @@
+"""
+To run tests:
+pytest-3 test_coach.py
+"""
+
+import numpy as np
+
+import Coach
+from MCTS import MCTS
+from test_mcts import BoxedNet, BoxedTicTacToeGame, DeterministicNet
+from tictactoe.TicTacToeGame import TicTacToeGame
+from utils import dotdict
+
+
+class CountingMCTS(MCTS):
+    """MCTS recording the simulations of every search of the lockstep driver."""
+
+    trees = []
+
+    def __init__(self, game, nnet, args):
+        MCTS.__init__(self, game, nnet, args)
+        self.searchSims = []
+        CountingMCTS.trees.append(self)
+
+    def getRoot(self, canonicalBoard):
+        self.searchSims.append(0)
+        return MCTS.getRoot(self, canonicalBoard)
+
+    def gatherLeaves(self, canonicalBoard, root, count):
+        leaves, sims = MCTS.gatherLeaves(self, canonicalBoard, root, count)
+        self.searchSims[-1] += sims + len(leaves)
+        return leaves, sims
+
+
+def test_lockstep_episodes(monkeypatch):
+    """Tests lockstep self-play ends every episode within the simulation budget."""
+    monkeypatch.setattr(Coach, 'MCTS', CountingMCTS)
+    CountingMCTS.trees = []
+    game = TicTacToeGame()
+    args = dotdict({'numMCTSSims': 15, 'cpuct': 1.0, 'tempThreshold': 15, 'searchBatchSize': 4})
+    coach = Coach.Coach(game, DeterministicNet(game), args)
+
+    np.random.seed(0)
+    episodeExamples = coach.executeEpisodesLockstep(5)
+    assert len(episodeExamples) == 5
+    for examples in episodeExamples:
+        assert len(examples) > 0
+        for board, pi, v in examples:
+            assert board.shape == game.getBoardSize()
+            assert len(pi) == game.getActionSize() and abs(sum(pi) - 1) < 1e-6
+            assert v in (-1, 1)
+    trees = [tree for tree in CountingMCTS.trees if tree.searchSims]
+    assert len(trees) == 5
+    for tree in trees:
+        assert all(sims == args.numMCTSSims for sims in tree.searchSims)
+
+
+def test_single_lockstep_episode_matches_execute_episode():
+    """Tests one lockstep episode plays the same game as executeEpisode."""
+    game = TicTacToeGame()
+    args = dotdict({'numMCTSSims': 15, 'cpuct': 1.0, 'tempThreshold': 15})
+    np.random.seed(1)
+    expected = Coach.Coach(game, DeterministicNet(game), args).executeEpisode()
+    np.random.seed(1)
+    actual, = Coach.Coach(game, DeterministicNet(game), args).executeEpisodesLockstep(1)
+    assert len(actual) == len(expected)
+    for (board, pi, v), (expectedBoard, expectedPi, expectedV) in zip(actual, expected):
+        assert np.array_equal(board, expectedBoard) and np.allclose(pi, expectedPi) and v == expectedV
+
+
+def test_augmented_symmetries_store_positions_once():
+    """Tests self-play with augmentSymmetries keeps one example per position."""
+    game = TicTacToeGame()
+    examples = []
+    for augment in [False, True]:
+        args = dotdict({'numMCTSSims': 5, 'cpuct': 1.0, 'tempThreshold': 15, 'augmentSymmetries': augment})
+        coach = Coach.Coach(game, DeterministicNet(game), args)
+        np.random.seed(0)
+        examples.append(coach.executeEpisode())
+    assert len(examples[0]) == 8 * len(examples[1])
+    for i, (board, pi, v) in enumerate(examples[1]):
+        assert np.array_equal(board, examples[0][8 * i + 7][0]) and v == examples[0][8 * i][2]
+
+
+def test_lockstep_episodes_board_objects():
+    """Tests lockstep self-play evaluates boards that are not arrays one by one."""
+    game = BoxedTicTacToeGame()
+    args = dotdict({'numMCTSSims': 10, 'cpuct': 1.0, 'tempThreshold': 15, 'searchBatchSize': 4})
+    np.random.seed(0)
+    episodeExamples = Coach.Coach(game, BoxedNet(game), args).executeEpisodesLockstep(2)
+    assert len(episodeExamples) == 2 and all(len(examples) > 0 for examples in episodeExamples)
@@ -0,0 +1,128 @@
+"""
+To run tests:
+pytest-3 test_evaluation_cache.py
+"""
+
+import numpy as np
+
+import Coach
+from EvaluationCache import EvaluationCache
+from othello.OthelloGame import OthelloGame
+from tafl.TaflGame import TaflGame
+from test_mcts import BoxedNet, BoxedTicTacToeGame, DeterministicNet
+from tictactoe.TicTacToeGame import TicTacToeGame
+from utils import dotdict
+
+
+class CountingNet(DeterministicNet):
+    """DeterministicNet counting the boards it evaluates."""
+
+    def __init__(self, game):
+        DeterministicNet.__init__(self, game)
+        self.evaluated = 0
+
+    def predict(self, board):
+        self.evaluated += 1
+        return DeterministicNet.predict(self, board)
+
+
+def test_cache_lru_and_versions():
+    """Tests the cache returns the network predictions and evicts the least recently used."""
+    game = TicTacToeGame()
+    net = CountingNet(game)
+    cache = EvaluationCache(game, net, maxEntries=2)
+    boards = [game.getInitBoard()]
+    for action in [0, 4]:
+        boards.append(game.getNextState(boards[-1], 1, action)[0])
+
+    for i in [0, 1, 0, 0]:
+        pi, v = cache.predict(boards[i])
+        expected_pi, expected_v = net.predict(boards[i])
+        assert np.allclose(pi, expected_pi) and v == expected_v
+    assert cache.getStats()['hits'] == 2 and cache.getStats()['misses'] == 2
+
+    # board 1 is the least recently used, and the batch evaluates board 2 once
+    net.evaluated = 0
+    pis, vs = cache.predict_batch(np.array([boards[2], boards[0], boards[2]]))
+    assert net.evaluated == 1 and np.array_equal(pis[0], pis[2])
+    assert cache.getStats()['evictions'] == 1
+    cache.predict(boards[1])
+    assert net.evaluated == 2
+
+    cache.setModelVersion(1)
+    assert cache.getStats()['invalidations'] == 2 and cache.getStats()['entries'] == 0
+    cache.predict(boards[1])
+    assert net.evaluated == 3
+
+
+def test_cache_board_objects():
+    """Tests the cache evaluates Tafl boards and boards that are not arrays."""
+    for game, net in [(TaflGame("Brandubh"), DeterministicNet), (BoxedTicTacToeGame(), BoxedNet)]:
+        cache = EvaluationCache(game, net(game), maxEntries=10)
+        board = game.getInitBoard()
+        nextBoard = game.getNextState(board, 1, np.flatnonzero(game.getValidMoves(board, 1))[0])[0]
+        pi, v = cache.predict(board)
+        assert np.allclose(pi, net(game).predict(board)[0]) and v == net(game).predict(board)[1]
+        pis, vs = cache.predict_batch([board, nextBoard])
+        assert np.allclose(pis[0], pi) and cache.getStats()['hits'] == 1 and cache.getStats()['misses'] == 2
+
+def test_self_play_with_cache():
+    """Tests self-play episodes of a Coach share the cache and play the same games."""
+    game = OthelloGame(4)
+    args = dotdict({'numMCTSSims': 10, 'cpuct': 1.0, 'tempThreshold': 0, 'evaluationCacheSize': 1000})
+    cached = Coach.Coach(game, CountingNet(game), args)
+    uncached = Coach.Coach(game, CountingNet(game), dotdict(dict(args, evaluationCacheSize=None)))
+    for coach in [cached, uncached]:
+        np.random.seed(0)  # ties between the most visited actions are broken at random
+        for _ in range(2):
+            coach.mcts = Coach.MCTS(game, coach.selfPlayNet, args)
+            episode = coach.executeEpisode()
+        coach.lastEpisode = episode
+    assert cached.selfPlayNet.getStats()['hits'] > 0
+    assert cached.nnet.evaluated < uncached.nnet.evaluated
+    assert all(np.array_equal(a[0], b[0]) and np.allclose(a[1], b[1]) and a[2] == b[2]
+               for a, b in zip(cached.lastEpisode, uncached.lastEpisode))
+
+
+def asymmetric_board(game, rng):
+    """Plays random moves until the symmetrical forms of the board are all different."""
+    board, player = game.getInitBoard(), 1
+    while True:
+        board, player = game.getNextState(board, player, rng.choice(np.flatnonzero(game.getValidMoves(board, player))))
+        canonicalBoard = game.getCanonicalForm(board, player)
+        symmetries = game.getSymmetries(canonicalBoard, np.arange(game.getActionSize()))
+        if len(set(np.array(b).tobytes() for b, _ in symmetries)) == len(symmetries):
+            return canonicalBoard
+
+
+def test_symmetric_canonical_forms():
+    """Tests all the symmetrical forms of a board have the same symmetric canonical form."""
+    from connect4.Connect4Game import Connect4Game
+    from gobang.GobangGame import GobangGame
+    from snowman.SnowmanGame import SnowmanGame
+    rng = np.random.RandomState(0)
+    for game in [OthelloGame(6), TicTacToeGame(), GobangGame(7, 4), Connect4Game(), SnowmanGame(4, 3)]:
+        board = asymmetric_board(game, rng)
+        pi = rng.rand(game.getActionSize())
+        symmetricBoard, permutation = game.getSymmetricCanonicalForm(board)
+        # pi is a policy of board for the policy symmetricPi of the symmetric board
+        symmetricPi = np.empty_like(pi)
+        symmetricPi[permutation] = pi
+        for otherBoard, otherPi in game.getSymmetries(board, pi):
+            otherSymmetricBoard, otherPermutation = game.getSymmetricCanonicalForm(np.array(otherBoard))
+            assert np.array_equal(otherSymmetricBoard, symmetricBoard)
+            assert np.allclose(symmetricPi[otherPermutation], otherPi)
+
+
+def test_symmetric_cache():
+    """Tests symmetrical forms of a board share one evaluation of the cache."""
+    game = OthelloGame(6)
+    net = CountingNet(game)
+    cache = EvaluationCache(game, net, maxEntries=100, symmetric=True)
+    board = asymmetric_board(game, np.random.RandomState(0))
+    pi, _ = cache.predict(board)
+    symmetries = game.getSymmetries(board, np.arange(game.getActionSize()))
+    pis, _ = cache.predict_batch(np.array([np.array(b) for b, _ in symmetries]))
+    assert net.evaluated == 1 and cache.getStats()['hits'] == len(symmetries)
+    for symmetricPi, (_, actions) in zip(pis, symmetries):
+        assert np.allclose(symmetricPi, pi[actions])
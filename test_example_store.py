@@ -0,0 +1,108 @@
+"""
+To run tests:
+pytest-3 test_example_store.py
+"""
+
+import os
+from collections import deque
+from pickle import Pickler
+
+import numpy as np
+
+from Coach import Coach
+from ExampleStore import ExampleShard, ExampleStore
+from test_mcts import BoxedBoard, BoxedTicTacToeGame, DeterministicNet
+from tictactoe.TicTacToeGame import TicTacToeGame
+from utils import SparsePolicy, dotdict, stackPolicies
+
+
+def random_examples(seed, count):
+    rng = np.random.RandomState(seed)
+    return [(rng.randint(-1, 2, size=(3, 3)).astype(np.int8), rng.dirichlet(np.ones(10)), rng.choice([-1, 1]))
+            for _ in range(count)]
+
+
+def assert_same_examples(shard, examples):
+    assert len(shard) == len(examples)
+    for (board, pi, v), (expectedBoard, expectedPi, expectedV) in zip(shard, examples):
+        assert np.array_equal(board, expectedBoard) and board.dtype == expectedBoard.dtype
+        assert np.allclose(pi, expectedPi) and v == expectedV
+
+
+def test_shards_and_index(tmp_path):
+    """Tests shards read back their examples and index files list them."""
+    store = ExampleStore(str(tmp_path))
+    history = [random_examples(0, 20), random_examples(1, 5)]
+    shards = [store.addShard(examples) for examples in history]
+    store.saveIndex('a.examples', shards)
+    assert isinstance(shards[0].boards, np.memmap)
+
+    # a new index only writes the new shard
+    shards = shards[1:] + [store.addShard(random_examples(2, 7))]
+    store.saveIndex('b.examples', shards)
+    assert sorted(os.listdir(os.path.join(str(tmp_path), 'shards'))) == ['0', '1', '2']
+
+    for filename, expected in [('a.examples', history), ('b.examples', history[1:] + [random_examples(2, 7)])]:
+        loaded = ExampleStore(str(tmp_path)).loadIndex(filename)
+        assert len(loaded) == len(expected)
+        for shard, examples in zip(loaded, expected):
+            assert_same_examples(shard, examples)
+
+
+def test_coach_history(tmp_path):
+    """Tests Coach saves its history of examples in a store and loads it back."""
+    game = TicTacToeGame()
+    args = dotdict({'numMCTSSims': 5, 'cpuct': 1.0, 'checkpoint': str(tmp_path),
+                    'load_folder_file': (str(tmp_path), 'checkpoint_1.pth.tar')})
+    coach = Coach(game, DeterministicNet(game), args)
+    history = [random_examples(0, 10), random_examples(1, 10), random_examples(2, 10)]
+    coach.trainExamplesHistory = [deque(history[0]), deque(history[1])]
+    coach.saveTrainExamples(0)
+    assert all(isinstance(examples, ExampleShard) for examples in coach.trainExamplesHistory)
+    coach.trainExamplesHistory.pop(0)
+    coach.trainExamplesHistory.append(deque(history[2]))
+    coach.saveTrainExamples(1)
+    # the shard of the iteration that dropped out of the history is deleted
+    assert sorted(os.listdir(os.path.join(str(tmp_path), 'shards'))) == ['1', '2']
+
+    loader = Coach(game, DeterministicNet(game), args)
+    loader.loadTrainExamples()
+    assert loader.skipFirstSelfPlay
+    assert len(loader.trainExamplesHistory) == 2
+    for shard, examples in zip(loader.trainExamplesHistory, history[1:]):
+        assert_same_examples(shard, examples)
+
+    # histories pickled before the store are still loaded
+    with open(os.path.join(str(tmp_path), 'checkpoint_1.pth.tar.examples'), 'wb') as f:
+        Pickler(f).dump([deque(history[0])])
+    loader.loadTrainExamples()
+    assert_same_examples(loader.trainExamplesHistory[0], history[0])
+
+
+def test_coach_history_board_objects(tmp_path):
+    """Tests Coach pickles histories whose boards the store can not hold."""
+    game = BoxedTicTacToeGame()
+    args = dotdict({'numMCTSSims': 5, 'cpuct': 1.0, 'checkpoint': str(tmp_path),
+                    'load_folder_file': (str(tmp_path), 'checkpoint_0.pth.tar')})
+    coach = Coach(game, DeterministicNet(game), args)
+    examples = [(BoxedBoard(board), pi, v) for board, pi, v in random_examples(0, 10)]
+    coach.trainExamplesHistory = [deque(examples)]
+    coach.saveTrainExamples(0)
+    assert not os.path.exists(os.path.join(str(tmp_path), 'shards'))
+
+    loader = Coach(game, DeterministicNet(game), args)
+    loader.loadTrainExamples()
+    loaded = list(loader.trainExamplesHistory[0])
+    assert len(loaded) == 10 and all(isinstance(board, BoxedBoard) for board, _, _ in loaded)
+    assert all(np.array_equal(board.pieces, expected.pieces) for (board, _, _), (expected, _, _) in zip(loaded, examples))
+
+
+def test_sparse_policies(tmp_path):
+    """Tests shards store SparsePolicy policies as their non-zero entries."""
+    examples = [(board, np.where(pi > 0.1, pi, 0), v) for board, pi, v in random_examples(0, 20)]
+    sparseExamples = [(board, SparsePolicy.fromDense(pi), v) for board, pi, v in examples]
+    shard = ExampleStore(str(tmp_path)).addShard(sparseExamples)
+    assert shard.pis is None and len(shard.piIndices) == sum(np.count_nonzero(pi) for _, pi, _ in examples)
+    assert all(isinstance(pi, SparsePolicy) for _, pi, _ in shard)
+    assert np.allclose(stackPolicies([pi for _, pi, _ in shard]), [pi for _, pi, _ in examples])
+    assert np.array_equal(shard[-1][0], examples[-1][0])
@@ -0,0 +1,86 @@
+"""
+To run tests:
+pytest-3 test_inference_server.py
+"""
+
+import multiprocessing
+
+import numpy as np
+import pytest
+
+from InferenceServer import InferenceServer
+from tafl.TaflGame import TaflGame
+from test_mcts import BoxedTicTacToeGame, DeterministicNet
+from tictactoe.TicTacToeGame import TicTacToeGame
+
+
+class BrokenNet(DeterministicNet):
+    """Network stand-in whose checkpoint fails to load."""
+
+    def load_checkpoint(self, folder, filename):
+        raise IOError('no checkpoint in %s' % folder)
+
+
+def random_boards(seed, count):
+    rng = np.random.RandomState(seed)
+    return rng.randint(-1, 2, size=(count, 3, 3)).astype(np.int8)
+
+
+_client = None
+
+
+def init_worker(client):
+    global _client
+    _client = client
+
+
+def predict_in_worker(seed):
+    return _client.predict_batch(random_boards(seed, 5))
+
+
+def test_server_predictions_and_stats():
+    """Tests clients in worker processes get the predictions of the network."""
+    game = TicTacToeGame()
+    server = InferenceServer(game, DeterministicNet, 'unused', 'unused', numClients=2, maxBoardsPerRequest=2)
+    server.start()
+    try:
+        context = multiprocessing.get_context('spawn')
+        # the client shares memory with the server, so it is passed when the workers start
+        with context.Pool(2, initializer=init_worker, initargs=(server.client,)) as pool:
+            results = pool.map(predict_in_worker, range(4))
+    finally:
+        stats = server.stop()
+
+    net = DeterministicNet(game)
+    for seed, (pis, vs) in enumerate(results):
+        expected_pis, expected_vs = net.predict_batch(random_boards(seed, 5))
+        assert np.allclose(pis, expected_pis) and np.allclose(vs, expected_vs)
+    assert stats['boards'] == 4 * 5
+    assert stats['requests'] == 4 * 3  # 5 boards in slots of 2
+    assert 0 < stats['meanFill'] <= 1
+
+
+def test_server_failure_raises():
+    """Tests clients and stop() raise instead of blocking if the server dies."""
+    server = InferenceServer(TicTacToeGame(), BrokenNet, 'unused', 'unused', numClients=1)
+    server.start()
+    with pytest.raises(RuntimeError):
+        server.client.predict_batch(random_boards(0, 1))
+    with pytest.raises(RuntimeError):
+        server.stop()
+
+
+def test_server_board_objects():
+    """Tests the server evaluates Tafl boards and rejects boards that are not arrays."""
+    game = TaflGame("Brandubh")
+    server = InferenceServer(game, DeterministicNet, 'unused', 'unused', numClients=1)
+    server.start()
+    try:
+        pi, v = server.client.predict(game.getInitBoard())
+    finally:
+        server.stop()
+    expected_pi, expected_v = DeterministicNet(game).predict(game.getInitBoard())
+    assert np.allclose(pi, expected_pi) and np.isclose(v, expected_v)
+
+    with pytest.raises(ValueError):
+        InferenceServer(BoxedTicTacToeGame(), DeterministicNet, 'unused', 'unused', numClients=1)
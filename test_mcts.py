@@ -0,0 +1,178 @@
+"""
+To run tests:
+pytest-3 test_mcts.py
+"""
+
+import zlib
+
+import numpy as np
+
+from MCTS import MCTS
+from NeuralNet import NeuralNet
+from othello.OthelloGame import OthelloGame
+from tafl.TaflGame import TaflGame
+from tictactoe.TicTacToeGame import TicTacToeGame
+from utils import dotdict
+
+
+class DeterministicNet(NeuralNet):
+    """Network stand-in whose (pi, v) only depend on the bytes of the board."""
+
+    def __init__(self, game):
+        self.action_size = game.getActionSize()
+
+    def predict(self, board):
+        rng = np.random.RandomState(zlib.crc32(np.ascontiguousarray(board).tobytes()))
+        pi = rng.rand(self.action_size)
+        return pi / np.sum(pi), rng.rand() * 2 - 1
+
+
+def play_game(game, args, seed, check=None):
+    """Plays one seeded self-play game and returns the policy of every move."""
+    np.random.seed(seed)
+    mcts = MCTS(game, DeterministicNet(game), args)
+    board, player = game.getInitBoard(), 1
+    pis = []
+    while game.getGameEnded(board, player) == 0:
+        canonicalBoard = game.getCanonicalForm(board, player)
+        pi = mcts.getActionProb(canonicalBoard, temp=1)
+        pis.append(pi)
+        if check:
+            check(mcts)
+        action = np.random.choice(len(pi), p=pi)
+        board, player = game.getNextState(board, player, action)
+    return pis
+
+
+def test_vectorized_selection_matches_loop():
+    """Tests both selection paths pick the same action at every node."""
+    def check(mcts):
+        for node in np.flatnonzero(mcts.expanded[:mcts.nodeCount]):
+            assert mcts.selectAction(node) == mcts.selectActionVectorized(node)
+
+    for game in [TicTacToeGame(), OthelloGame(6)]:
+        for seed in range(2):
+            args = dotdict({'numMCTSSims': 25, 'cpuct': 1.0})
+            play_game(game, args, seed, check)
+
+
+def test_vectorized_selection_same_games():
+    """Tests seeded games are identical whichever selection path is used."""
+    for game in [TicTacToeGame(), OthelloGame(6)]:
+        for seed in range(2):
+            loop_pis = play_game(game, dotdict({'numMCTSSims': 25, 'cpuct': 1.0,
+                                                'vectorizedSelection': False}), seed)
+            vectorized_pis = play_game(game, dotdict({'numMCTSSims': 25, 'cpuct': 1.0,
+                                                      'vectorizedSelection': True}), seed)
+            assert loop_pis == vectorized_pis
+
+
+def test_batched_search():
+    """Tests batched search runs numMCTSSims simulations and clears virtual loss."""
+    game = OthelloGame(6)
+    for batch_size in [1, 4, 16]:
+        args = dotdict({'numMCTSSims': 100, 'cpuct': 1.0, 'searchBatchSize': batch_size, 'virtualLoss': 1})
+        mcts = MCTS(game, DeterministicNet(game), args)
+        pi = mcts.getActionProb(game.getInitBoard(), temp=1)
+        assert abs(sum(pi) - 1) < 1e-6
+        assert np.sum(mcts.Nsa[0]) == 99  # the first simulation expands the root
+        assert not mcts.VLsa.any() and not mcts.VLs.any()
+
+
+class BoxedBoard():
+    """Board object numpy does not convert to an array."""
+
+    def __init__(self, pieces):
+        self.pieces = pieces
+
+
+class BoxedTicTacToeGame(TicTacToeGame):
+    """TicTacToe played on BoxedBoard objects."""
+
+    def getInitBoard(self):
+        return BoxedBoard(TicTacToeGame.getInitBoard(self))
+
+    def getNextState(self, board, player, action):
+        pieces, player = TicTacToeGame.getNextState(self, board.pieces, player, action)
+        return BoxedBoard(pieces), player
+
+    def getValidMoves(self, board, player):
+        return TicTacToeGame.getValidMoves(self, board.pieces, player)
+
+    def getGameEnded(self, board, player):
+        return TicTacToeGame.getGameEnded(self, board.pieces, player)
+
+    def getCanonicalForm(self, board, player):
+        return BoxedBoard(TicTacToeGame.getCanonicalForm(self, board.pieces, player))
+
+    def stringRepresentation(self, board):
+        return TicTacToeGame.stringRepresentation(self, board.pieces)
+
+    def getSymmetries(self, board, pi):
+        return [(board, pi)]
+
+
+class BoxedNet(DeterministicNet):
+    """DeterministicNet for BoxedBoard objects, whose batches must be numeric arrays like in the wrappers."""
+
+    def predict(self, board):
+        return DeterministicNet.predict(self, board.pieces)
+
+    def predict_batch(self, boards):
+        return DeterministicNet.predict_batch(self, np.asarray(boards, dtype=np.float32))
+
+
+def test_batched_search_board_objects():
+    """Tests batched search evaluates boards that are not arrays one by one."""
+    game, boxedGame = TicTacToeGame(), BoxedTicTacToeGame()
+    args = dotdict({'numMCTSSims': 50, 'cpuct': 1.0, 'searchBatchSize': 4, 'virtualLoss': 1})
+    pi = MCTS(game, DeterministicNet(game), args).getActionProb(game.getInitBoard(), temp=1)
+    assert MCTS(boxedGame, BoxedNet(boxedGame), args).getActionProb(boxedGame.getInitBoard(), temp=1) == pi
+
+    game = TaflGame("Brandubh")
+    mcts = MCTS(game, DeterministicNet(game), args)
+    assert abs(sum(mcts.getActionProb(game.getInitBoard(), temp=1)) - 1) < 1e-6
+
+def test_incremental_hash_keys():
+    """Tests incrementally updated keys match keys computed from the boards."""
+    game = OthelloGame(6)
+    np.random.seed(0)
+    board, player = game.getInitBoard(), 1
+    key = game.getHashKey(board)
+    while game.getGameEnded(board, player) == 0:
+        canonicalBoard = game.getCanonicalForm(board, player)
+        assert game.getCanonicalHashKey(board, key, player) == game.getHashKey(canonicalBoard)
+        action = np.random.choice(np.flatnonzero(game.getValidMoves(board, player)))
+        board, player, key = game.getNextStateWithKey(board, player, action, key)
+        assert key == game.getHashKey(board)
+
+
+def test_reuse_tree_bounded():
+    """Tests tree reuse keeps the visits of the subtree and bounds the tree size."""
+    game = OthelloGame(6)
+    args = dotdict({'numMCTSSims': 25, 'cpuct': 1.0, 'reuseTree': True})
+    rootVisits = []
+
+    def check(mcts):
+        assert mcts.nodeCount < 3 * args.numMCTSSims
+        assert mcts.capacity <= 8 * args.numMCTSSims
+        rootVisits.append(max(mcts.Ns[:mcts.nodeCount]))
+
+    play_game(game, args, 0, check)
+    assert max(rootVisits) > args.numMCTSSims
+
+
+def test_node_budget():
+    """Tests the tree never exceeds its node budget and still searches."""
+    game = OthelloGame(6)
+    for policy in ['lru', 'visits']:
+        for batch_size in [1, 4]:
+            args = dotdict({'numMCTSSims': 30, 'cpuct': 1.0, 'maxNodes': 20, 'evictionPolicy': policy,
+                            'searchBatchSize': batch_size})
+
+            def check(mcts):
+                assert mcts.nodeCount <= 20 and mcts.capacity <= 20
+                assert len(mcts.nodes) == mcts.getStats()['nodes']
+
+            pis = play_game(game, args, 0, check)
+            assert all(abs(sum(pi) - 1) < 1e-6 for pi in pis)
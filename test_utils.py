@@ -0,0 +1,84 @@
+"""
+To run tests:
+pytest-3 test_utils.py
+"""
+
+import numpy as np
+import pytest
+
+from Game import Game
+from snowman.SnowmanGame import SnowmanGame
+from tictactoe.TicTacToeGame import TicTacToeGame
+from utils import MinibatchSampler, SparsePolicy, packExamples, SymmetryTables, squareSymmetries
+
+
+def test_minibatch_sampler():
+    """Tests every epoch yields disjoint float32 minibatches of the examples."""
+    examples = [(np.full((2, 2), i, dtype=np.int8), np.full(3, i / 10), i) for i in range(10)]
+    sampler = MinibatchSampler(examples, 3, prefetch=1)
+    assert len(sampler) == 3
+    for _ in range(2):
+        seen = []
+        for boards, pis, vs in sampler:
+            assert boards.dtype == pis.dtype == vs.dtype == np.float32
+            assert boards.shape == (3, 2, 2) and pis.shape == (3, 3) and vs.shape == (3,)
+            assert np.array_equal(boards[:, 0, 0], vs) and np.allclose(pis[:, 0], vs / 10)
+            seen += vs.tolist()
+        assert len(set(seen)) == 9
+
+    # abandoned epochs and failing transforms do not block
+    next(iter(sampler))
+
+    def fail(boards, pis, vs):
+        raise ValueError('transform failed')
+
+    with pytest.raises(ValueError):
+        list(MinibatchSampler(examples, 3, transform=fail))
+
+
+def test_minibatch_sampler_sparse_policies():
+    """Tests SparsePolicy policies are densified in their minibatch."""
+    examples = [(np.zeros((2, 2), dtype=np.int8), np.eye(6)[i % 6] / 2, i) for i in range(10)]
+    sparseExamples = [(board, SparsePolicy.fromDense(pi), v) for board, pi, v in examples]
+    assert isinstance(MinibatchSampler(sparseExamples, 3).columns[1][0], SparsePolicy)
+    assert isinstance(packExamples(sparseExamples)[1][0], SparsePolicy)
+    assert np.array_equal(packExamples(sparseExamples, densify=True)[1], [pi for _, pi, _ in examples])
+    for boards, pis, vs in MinibatchSampler(sparseExamples, 3):
+        assert pis.dtype == np.float32 and pis.shape == (3, 6)
+        assert np.array_equal(pis, [examples[int(v)][1] for v in vs])
+
+def test_minibatch_sampler_symmetries():
+    """Tests minibatches with a game hold random symmetrical forms of the examples."""
+    game = TicTacToeGame()
+    rng = np.random.RandomState(0)
+    examples = [(rng.randint(-1, 2, size=(3, 3)).astype(np.int8), rng.dirichlet(np.ones(10)), i) for i in range(40)]
+    np.random.seed(0)
+    seen = set()
+    for boards, pis, vs in MinibatchSampler(examples, 8, game=game):
+        for board, pi, v in zip(boards, pis, vs):
+            symmetries = game.getSymmetries(*examples[int(v)][:2])
+            s = [s for s, (symmBoard, symmPi) in enumerate(symmetries)
+                 if np.array_equal(board, symmBoard) and np.allclose(pi, symmPi)]
+            assert s
+            seen.add(s[0])
+    assert len(seen) > 4
+
+def test_symmetry_tables():
+    """Tests the gathered symmetries match their transforms, one by one and batched."""
+    rng = np.random.RandomState(0)
+    tables = SymmetryTables((5, 5, 2), 5 * 5 * 3 + 1, lambda board, pi: squareSymmetries(board, pi, (5, 5, 3)))
+    boards = rng.randint(-1, 2, size=(4, 5, 5, 2)).astype(np.int8)
+    pis = rng.rand(4, 5 * 5 * 3 + 1)
+    for board, pi in zip(boards, pis):
+        for (symmBoard, symmPi), (expectedBoard, expectedPi) in zip(tables.getSymmetries(board, pi),
+                                                                    squareSymmetries(board, pi, (5, 5, 3))):
+            assert np.array_equal(symmBoard, expectedBoard) and symmBoard.dtype == np.int8
+            assert np.array_equal(symmPi, expectedPi)
+
+    game = SnowmanGame()
+    boards = rng.randint(0, 2, size=(3,) + game.getBoardSize()).astype(np.int8)
+    pis = rng.rand(3, game.getActionSize())
+    symmBoards, symmPis = game.getSymmetriesBatch(boards, pis)
+    expectedBoards, expectedPis = Game.getSymmetriesBatch(game, boards, pis)
+    assert symmBoards.shape == (8,) + boards.shape and symmPis.shape == (8,) + pis.shape
+    assert np.array_equal(symmBoards, expectedBoards) and np.array_equal(symmPis, expectedPis)
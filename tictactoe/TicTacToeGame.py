@@ -2,6 +2,7 @@ from __future__ import print_function
 import sys
 sys.path.append('..')
 from Game import Game
+from utils import SymmetryTables, squareSymmetries, symmetricCanonicalForm
 from .TicTacToeLogic import Board
 import numpy as np
 
@@ -17,11 +18,13 @@ Based on the OthelloGame by Surag Nair.
 class TicTacToeGame(Game):
     def __init__(self, n=3):
         self.n = n
+        # index permutations of the symmetries, gathered by getSymmetries
+        self.symmetries = SymmetryTables((n, n), n*n + 1, lambda board, pi: squareSymmetries(board, pi, (n, n)))
 
     def getInitBoard(self):
         # return initial board (numpy board)
         b = Board(self.n)
-        return np.array(b.pieces)
+        return np.array(b.pieces, dtype=np.int8)
 
     def getBoardSize(self):
         # (a,b) tuple
@@ -77,18 +80,13 @@ class TicTacToeGame(Game):
     def getSymmetries(self, board, pi):
         # mirror, rotational
         assert(len(pi) == self.n**2+1)  # 1 for pass
-        pi_board = np.reshape(pi[:-1], (self.n, self.n))
-        l = []
-
-        for i in range(1, 5):
-            for j in [True, False]:
-                newB = np.rot90(board, i)
-                newPi = np.rot90(pi_board, i)
-                if j:
-                    newB = np.fliplr(newB)
-                    newPi = np.fliplr(newPi)
-                l += [(newB, list(newPi.ravel()) + [pi[-1]])]
-        return l
+        return self.symmetries.getSymmetries(board, pi)
+
+    def getSymmetriesBatch(self, boards, pis):
+        return self.symmetries.getSymmetriesBatch(boards, pis)
+
+    def getSymmetricCanonicalForm(self, board):
+        return symmetricCanonicalForm(self, board)
 
     def stringRepresentation(self, board):
         # 8x8 numpy array (canonical board)
@@ -2,7 +2,7 @@ from __future__ import print_function
 import sys
 sys.path.append('..')
 from Game import Game
-from .TicTacToeLogic import Board
+from .TicTacToeLogic import Board, get_winning_lines
 import numpy as np
 
 """
@@ -20,7 +20,7 @@ class TicTacToeGame(Game):
     def getInitBoard(self):
         # return initial board (numpy board)
         b = Board(self.n)
-        return np.array(b.pieces)
+        return np.array(b.pieces, dtype=np.int8)
 
     def getBoardSize(self):
         # (a,b) tuple
@@ -60,14 +60,13 @@ class TicTacToeGame(Game):
     def getGameEnded(self, board, player):
         # return 0 if not ended, 1 if player 1 won, -1 if player 1 lost
         # player = 1
-        b = Board(self.n)
-        b.pieces = np.copy(board)
-
-        if b.is_win(player):
+        lines = get_winning_lines(self.n)
+        sums = np.ravel(board)[lines].sum(axis=1)
+        if (sums == self.n*player).any():
             return 1
-        if b.is_win(-player):
+        if (sums == -self.n*player).any():
             return -1
-        if b.has_legal_moves():
+        if (board == 0).any():
             return 0
         # draw has a very little value 
         return 1e-4
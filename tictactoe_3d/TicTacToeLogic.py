@@ -1,3 +1,6 @@
+import itertools
+from functools import lru_cache
+
 import numpy as np
 '''
 Board class for the game of TicTacToe.
@@ -15,6 +18,24 @@ Date: Jan 5, 2018.
 Based on the board for the game of Othello by Eric P. Nichols.
 
 '''
+@lru_cache(maxsize=None)
+def get_winning_lines(n):
+    """Returns the winning lines of an n x n x n cube as an array of shape
+    (number of lines, n) of indices into the flattened pieces[z,x,y].
+    """
+    # one of each pair of opposite directions
+    directions = [d for d in itertools.product([-1, 0, 1], repeat=3) if d > (0, 0, 0)]
+    lines = []
+    for start in itertools.product(range(n), repeat=3):
+        for d in directions:
+            # a line of n cells must start on the face of the cube behind it
+            cells = np.array(start) + np.outer(np.arange(-1, n), d)
+            if (cells[0] < 0).any() or (cells[0] >= n).any():
+                if ((cells[1:] >= 0) & (cells[1:] < n)).all():
+                    lines.append(np.ravel_multi_index(tuple(cells[1:].T), (n, n, n)))
+    return np.array(lines)
+
+
 # from bkcharts.attributes import color
 class Board():
 
@@ -63,180 +84,11 @@ class Board():
         return False
     
     def is_win(self, color):
-        """Check whether the given player has collected a triplet in any direction; 
+        """Check whether the given player has collected a line of n in any direction;
         @param color (1=white,-1=black)
         """
-        win = self.n
-        # check z-dimension
-        count = 0
-        for z in range(self.n):
-            count = 0
-            for y in range(self.n):
-                count = 0
-                for x in range(self.n):
-                    if self.pieces[z,x,y]==color:
-                        count += 1
-                if count==win:
-                    return True
-
-        count = 0
-        for z in range(self.n):
-            count = 0
-            for x in range(self.n):
-                count = 0
-                for y in range(self.n):
-                    if self.pieces[z,x,y]==color:
-                        count += 1
-                if count==win:
-                    return True
-        
-        # check x dimension
-        count = 0
-        for x in range(self.n):
-            count = 0
-            for z in range(self.n):
-                count = 0
-                for y in range(self.n):
-                    if self.pieces[z,x,y]==color:
-                        count += 1
-                if count==win:
-                    return True
-
-        count = 0
-        for x in range(self.n):
-            count = 0
-            for y in range(self.n):
-                count = 0
-                for z in range(self.n):
-                    if self.pieces[z,x,y]==color:
-                        count += 1
-                if count==win:
-                    return True
-
-        # check y dimension
-        count = 0
-        for y in range(self.n):
-            count = 0
-            for x in range(self.n):
-                count = 0
-                for z in range(self.n):
-                    if self.pieces[z,x,y]==color:
-                        count += 1
-                if count==win:
-                    return True
-        
-        count = 0
-        for y in range(self.n):
-            count = 0
-            for z in range(self.n):
-                count = 0
-                for x in range(self.n):
-                    if self.pieces[z,x,y]==color:
-                        count += 1
-                if count==win:
-                    return True
-        
-        # check flat diagonals
-        # check z dimension
-        count = 0
-        for z in range(self.n):
-            count = 0
-            for d in range(self.n):
-                if self.pieces[z,d,d]==color:
-                    count += 1
-            if count==win:
-                return True
-        
-        count = 0
-        for z in range(self.n):
-            count = 0
-            for d in range(self.n):
-                if self.pieces[z,d,self.n-d-1]==color:
-                    count += 1
-            if count==win:
-                return True
-
-        # check x dimension
-        count = 0
-        for x in range(self.n):
-            count = 0
-            for d in range(self.n):
-                if self.pieces[d,x,d]==color:
-                    count += 1
-            if count==win:
-                return True
-
-        count = 0
-        for x in range(self.n):
-            count = 0
-            for d in range(self.n):
-                if self.pieces[d,x,self.n-d-1]==color:
-                    count += 1
-            if count==win:
-                return True
-
-        # check y dimension
-        count = 0
-        for y in range(self.n):
-            count = 0
-            for d in range(self.n):
-                if self.pieces[d,d,y]==color:
-                    count += 1
-            if count==win:
-                return True
-
-        count = 0
-        for y in range(self.n):
-            count = 0
-            for d in range(self.n):
-                if self.pieces[self.n-d-1,d,y]==color:
-                    count += 1
-            if count==win:
-                return True
-        
-        # check 4 true diagonals
-        count = 0
-        if self.pieces[0,0,0] == color:
-            count += 1
-            if self.pieces[1,1,1] == color:
-                count += 1
-                if self.pieces[2,2,2] == color:
-                    count += 1
-                    if count == win:
-                        return True
-            
-        count = 0
-        if self.pieces[2,0,0] == color:
-            count += 1
-            if self.pieces[1,1,1] == color:
-                count += 1
-                if self.pieces[0,2,2] == color:
-                    count += 1
-                    if count == win:
-                        return True
-        
-        count = 0
-        if self.pieces[2,2,0] == color:
-            count += 1
-            if self.pieces[1,1,1] == color:
-                count += 1
-                if self.pieces[0,0,2] == color:
-                    count += 1
-                    if count == win:
-                        return True
-        
-        count = 0
-        if self.pieces[0,2,0] == color:
-            count += 1
-            if self.pieces[1,1,1] == color:
-                count += 1
-                if self.pieces[2,0,2] == color:
-                    count += 1
-                    if count == win:
-                        return True
-
-        # return false if no 3 is reached
-        return False
+        lines = get_winning_lines(self.n)
+        return bool((self.pieces.ravel()[lines].sum(axis=1) == self.n*color).any())
 
     def execute_move(self, move, color):
         """Perform the given move on the board; 
@@ -0,0 +1,19 @@
+"""
+To run tests:
+pytest-3 tictactoe_3d
+"""
+
+import numpy as np
+
+from tictactoe_3d.TicTacToeLogic import get_winning_lines
+
+
+def test_winning_lines():
+    """Tests the table holds every line of the cube, (n+2)^3-n^3 / 2 of them."""
+    for n in [3, 4, 5]:
+        lines = get_winning_lines(n)
+        assert len(lines) == ((n + 2) ** 3 - n ** 3) // 2
+        assert len(set(map(tuple, np.sort(lines, axis=1)))) == len(lines)
+        # a corner is on 3 edges, 3 face diagonals and 1 space diagonal
+        assert np.count_nonzero((lines == 0).any(axis=1)) == 7
+
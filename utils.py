@@ -1,3 +1,10 @@
+import queue
+import threading
+import warnings
+
+import numpy as np
+
+
 class AverageMeter(object):
     """From https://github.com/pytorch/examples/blob/master/imagenet/main.py"""
 
@@ -19,4 +26,305 @@ class AverageMeter(object):
 
 class dotdict(dict):
     def __getattr__(self, name):
-        return self[name]
+        # raising AttributeError lets getattr(args, name, default) read optional settings
+        try:
+            return self[name]
+        except KeyError:
+            raise AttributeError(name)
+
+
+def stackBoards(boards):
+    """
+    Returns:
+        boards: the boards stacked along the first axis of a numeric numpy
+                array, or None if they do not convert to one (e.g. boards
+                that are game specific objects)
+    """
+    try:
+        with warnings.catch_warnings():
+            # older numpy versions only warn about boards of different shapes
+            warnings.simplefilter('ignore')
+            stacked = np.array(boards)
+    except ValueError:
+        return None
+    return None if stacked.dtype == object else stacked
+
+
+def predictBoards(nnet, boards):
+    """
+    Evaluates a list of boards with a single nnet.predict_batch call, or with
+    nnet.predict on every board if they do not stack (see stackBoards).
+
+    Returns:
+        pis, vs: numpy arrays of the policy vectors and values of the boards
+    """
+    stacked = stackBoards(boards)
+    if stacked is None:
+        pis, vs = zip(*[nnet.predict(board) for board in boards])
+        return np.array(pis), np.reshape(vs, -1)
+    return nnet.predict_batch(stacked)
+
+
+class ZobristHash(object):
+    """
+    Zobrist keys for boards made of pieces, where a piece is an index for a
+    (square, content) pair. The canonical form of a board must swap every
+    piece with its partner piece (e.g. the same square with the opponent's
+    colour).
+
+    A key packs the Zobrist hash h of the board in its low 64 bits and the XOR
+    m of the swap masks Z[piece] ^ Z[partner] of its pieces in the high 64
+    bits. Adding or removing a piece and swapping all the pieces of a board
+    then take a single XOR each.
+
+    Keys are therefore 128-bit Python ints rather than 64-bit hashes: a 64
+    bit key alone can not be swapped, as the mask m depends on the pieces
+    of the board. Only the hash h identifies the board.
+    """
+
+    def __init__(self, partners, seed=0):
+        """
+        Input:
+            partners: partners[piece] is the piece swapped with piece, or
+                      piece itself if it is not swapped
+        """
+        partners = np.asarray(partners)
+        self.hashes = np.frombuffer(np.random.RandomState(seed).bytes(8 * len(partners)), dtype=np.uint64)
+        self.masks = self.hashes ^ self.hashes[partners]
+        self.toggles = [int(h) | (int(m) << 64) for h, m in zip(self.hashes, self.masks)]
+
+    def getKey(self, pieces):
+        """
+        Returns:
+            key: the key of a board holding the pieces in the pieces array
+        """
+        return (int(np.bitwise_xor.reduce(self.hashes[pieces], initial=np.uint64(0))) |
+                int(np.bitwise_xor.reduce(self.masks[pieces], initial=np.uint64(0))) << 64)
+
+    def toggle(self, key, piece):
+        """
+        Returns:
+            key: key with piece added to or removed from the board
+        """
+        return key ^ self.toggles[piece]
+
+    @staticmethod
+    def swap(key):
+        """
+        Returns:
+            key: key of the board with every piece swapped with its partner
+        """
+        return key ^ (key >> 64)
+
+
+class SymmetryTables(object):
+    """
+    The symmetries of a game as index permutations, built once: the s-th
+    symmetrical form of a board gathers its flattened entries with
+    boardPermutations[s] and the one of a policy gathers its actions with
+    actionPermutations[s]. Game.getSymmetries and getSymmetriesBatch are
+    then one gather per symmetry.
+    """
+
+    def __init__(self, boardShape, actionSize, transform):
+        """
+        Input:
+            boardShape: shape of a board
+            actionSize: size of a policy
+            transform: function returning the list of (board, pi) symmetrical
+                       forms of a board and a policy, as Game.getSymmetries.
+                       It must only move their entries, it is called once
+                       with the indices of the entries.
+        """
+        self.boardShape = tuple(boardShape)
+        symmetries = transform(np.arange(np.prod(boardShape)).reshape(boardShape), np.arange(actionSize))
+        self.boardPermutations = np.array([np.ravel(board) for board, _ in symmetries])
+        self.actionPermutations = np.array([np.ravel(pi) for _, pi in symmetries])
+
+    def getSymmetries(self, board, pi):
+        board = np.ravel(board)
+        pi = np.asarray(pi)
+        return [(board[boardPermutation].reshape(self.boardShape), pi[actionPermutation])
+                for boardPermutation, actionPermutation in zip(self.boardPermutations, self.actionPermutations)]
+
+    def getSymmetriesBatch(self, boards, pis):
+        boards = np.reshape(boards, (len(boards), -1))
+        symmetricBoards = np.swapaxes(boards[:, self.boardPermutations], 0, 1)
+        symmetricPis = np.swapaxes(np.asarray(pis)[:, self.actionPermutations], 0, 1)
+        return symmetricBoards.reshape((len(self.boardPermutations), len(boards)) + self.boardShape), symmetricPis
+
+
+def squareSymmetries(board, pi, actionShape):
+    """
+    The rotations and mirrors of a square board and of a policy made of the
+    actions of every square (e.g. placing a stone) followed by a pass action.
+    It is the transform of the SymmetryTables of the square board games.
+
+    Input:
+        actionShape: shape of the square actions of pi, (n, n) or (n, n,
+                     actions per square)
+
+    Returns:
+        symmForms: list of the 8 [(board,pi)] symmetrical forms
+    """
+    pi_board = np.reshape(pi[:-1], actionShape)
+    l = []
+
+    for i in range(1, 5):
+        for j in [True, False]:
+            newB = np.rot90(board, i)
+            newPi = np.rot90(pi_board, i)
+            if j:
+                newB = np.fliplr(newB)
+                newPi = np.fliplr(newPi)
+            l += [(newB, np.append(newPi.ravel(), pi[-1]))]
+    return l
+
+
+def randomSymmetries(game, boards, pis):
+    """
+    Returns:
+        boards, pis: the boards and pis stacked along the first axis, each
+                     example replaced by one of its symmetrical forms (see
+                     Game.getSymmetries) chosen at random
+    """
+    symmBoards, symmPis = game.getSymmetriesBatch(boards, pis)
+    choices = np.random.randint(len(symmBoards), size=len(boards))
+    return symmBoards[choices, np.arange(len(boards))], symmPis[choices, np.arange(len(boards))]
+
+def symmetricCanonicalForm(game, board):
+    """
+    Implements Game.getSymmetricCanonicalForm with game.getSymmetries: the
+    symmetrical form of board with the smallest bytes is chosen.
+
+    Returns:
+        symmetricBoard: the chosen symmetrical form of board
+        permutation: index array with pi = symmetricPi[permutation]
+    """
+    # the symmetries of the identity policy are the permutations of the actions
+    symmetries = game.getSymmetries(board, np.arange(game.getActionSize()))
+    symmetricBoard, actions = min(symmetries, key=lambda symmetry: np.ascontiguousarray(symmetry[0]).tobytes())
+    return np.ascontiguousarray(symmetricBoard), np.argsort(actions)
+
+class SparsePolicy(object):
+    """
+    A policy vector of size entries stored as the indices and probabilities
+    of its non-zero entries, for the training examples of games with large
+    action spaces. stackPolicies densifies them, e.g. when a minibatch is
+    built.
+    """
+
+    def __init__(self, indices, probabilities, size):
+        self.indices = indices
+        self.probabilities = probabilities
+        self.size = size
+
+    @staticmethod
+    def fromDense(pi):
+        pi = np.asarray(pi)
+        indices = np.flatnonzero(pi)
+        return SparsePolicy(indices.astype(np.int32), pi[indices].astype(np.float32), len(pi))
+
+
+def stackPolicies(pis):
+    """
+    Returns:
+        pis: float32 array of the policy vectors pis stacked along the first
+             axis, where SparsePolicy ones are densified
+    """
+    if len(pis) and isinstance(pis[0], SparsePolicy):
+        stacked = np.zeros((len(pis), pis[0].size), dtype=np.float32)
+        for row, pi in zip(stacked, pis):
+            row[pi.indices] = pi.probabilities
+        return stacked
+    return np.array(pis, dtype=np.float32)
+
+
+def packExamples(examples, densify=False):
+    """
+    Returns:
+        boards, pis, vs: contiguous float32 arrays of the boards, policies and
+                         values of a list of (board, pi, v) examples.
+                         SparsePolicy policies are kept in an object array,
+                         for stackPolicies to densify them per minibatch,
+                         unless densify is set.
+    """
+    pis = [pi for _, pi, _ in examples]
+    if not densify and len(pis) and isinstance(pis[0], SparsePolicy):
+        sparsePis = np.empty(len(pis), dtype=object)
+        sparsePis[:] = pis
+        pis = sparsePis
+    else:
+        pis = stackPolicies(pis)
+    return (np.array([board for board, _, _ in examples], dtype=np.float32),
+            pis,
+            np.array([v for _, _, v in examples], dtype=np.float32))
+
+
+class MinibatchSampler(object):
+    """
+    Minibatches of training examples for NNetWrapper.train. The examples are
+    packed once into float32 arrays (see packExamples) and every epoch draws
+    a single permutation of them, a minibatch gathers its rows of the arrays.
+
+    Iterating over the sampler yields the len(sampler) minibatches of one
+    epoch, each one as a (boards, pis, vs) tuple, or as transform(boards,
+    pis, vs) with a transform (e.g. to tensors on the GPU). A background
+    thread shuffles and transforms the next prefetch minibatches while the
+    network trains on the current one.
+
+    With a game, the examples hold each position once and every minibatch
+    replaces its examples by random symmetrical forms (see randomSymmetries).
+    SparsePolicy policies are only densified in their minibatch.
+    """
+
+    def __init__(self, examples, batchSize, transform=None, prefetch=2, game=None):
+        self.columns = packExamples(examples)
+        self.batchSize = batchSize
+        self.transform = transform
+        self.prefetch = prefetch
+        self.game = game
+
+    def __len__(self):
+        # like sampling batch_size random examples per step, partial minibatches are skipped
+        return len(self.columns[-1]) // self.batchSize
+
+    def __iter__(self):
+        batches = queue.Queue(self.prefetch)
+        stopped = threading.Event()
+        order = np.random.permutation(len(self.columns[-1]))
+
+        def produce():
+            try:
+                for start in range(0, len(self) * self.batchSize, self.batchSize):
+                    # only the rows of the minibatch are gathered, the columns are not shuffled as a whole
+                    rows = order[start:start + self.batchSize]
+                    batch = tuple(column[rows] for column in self.columns)
+                    if batch[1].dtype == object:
+                        batch = (batch[0], stackPolicies(batch[1]), batch[2])
+                    if self.game is not None:
+                        boards, pis, vs = batch
+                        batch = randomSymmetries(self.game, boards, pis) + (vs,)
+                    if self.transform:
+                        batch = self.transform(*batch)
+                    while True:
+                        if stopped.is_set():
+                            return
+                        try:
+                            batches.put((batch, None), timeout=0.1)
+                            break
+                        except queue.Full:
+                            pass
+            except Exception as e:
+                batches.put((None, e))
+
+        threading.Thread(target=produce, daemon=True).start()
+        try:
+            for _ in range(len(self)):
+                batch, error = batches.get()
+                if error is not None:
+                    raise error
+                yield batch
+        finally:
+            # lets the producer exit if the epoch is abandoned
+            stopped.set()